@@ -0,0 +1,170 @@
+import glob
+import json
+import os
+import sys
+import numpy as np
+import pandas as pd
+from pandas.api.types import union_categoricals
+from csvCache import loadCSV
+from detectionStore import CSV_FILES, ARCHIVE_PATTERN, DEFAULT_STATION
+from rollups import countDetections
+from speciesRegistry import filterByPolicy
+
+# The live CSV and every archive_*.csv written by rotate_csv() as one
+# time-ordered dataset. data/archives.json keeps the min/max timestamp and
+# row count per archive (archives are immutable, so each is scanned once),
+# which lets a query skip archives outside its time range. Matching
+# archives are read in chunks and filtered/aggregated chunk by chunk, so
+# memory stays bounded by the chunk size and the size of the result.
+LIVE_CSV = CSV_FILES[0]
+MANIFEST = "data/archives.json"
+CHUNKSIZE = 200000
+
+def _emptyFrame():
+    return pd.DataFrame({
+        "timestamp": pd.Series([], dtype="datetime64[ns]"),
+        "species": pd.Series([], dtype="category"),
+        "confidence": pd.Series([], dtype="float64"),
+    })
+
+def _parseChunk(chunk):
+    chunk["timestamp"] = pd.to_datetime(chunk["timestamp"], errors="coerce", format="ISO8601")
+    chunk["confidence"] = pd.to_numeric(chunk["confidence"], errors="coerce")
+    return chunk.dropna()
+
+def _scanArchive(path, chunksize=CHUNKSIZE):
+    # --- Min/max timestamp and row count of one archive ---
+    lo, hi, rows = None, None, 0
+    for chunk in pd.read_csv(path, chunksize=chunksize, usecols=["timestamp"]):
+        ts = pd.to_datetime(chunk["timestamp"], errors="coerce", format="ISO8601").dropna()
+        if len(ts) == 0:
+            continue
+        lo = ts.min() if lo is None else min(lo, ts.min())
+        hi = ts.max() if hi is None else max(hi, ts.max())
+        rows += len(ts)
+    return {"min": None if lo is None else str(lo), "max": None if hi is None else str(hi), "rows": rows}
+
+def updateManifest(pattern=ARCHIVE_PATTERN, manifestPath=MANIFEST):
+    try:
+        with open(manifestPath) as f:
+            manifest = json.load(f)
+    except (FileNotFoundError, ValueError):
+        manifest = {}
+
+    changed = False
+    names = set()
+    for path in sorted(glob.glob(pattern)):
+        st = os.stat(path)
+        name = os.path.basename(path)
+        names.add(name)
+        entry = manifest.get(name)
+        if entry is None or entry["size"] != st.st_size or entry["mtime"] != st.st_mtime:
+            entry = _scanArchive(path)
+            entry.update({"size": st.st_size, "mtime": st.st_mtime})
+            manifest[name] = entry
+            changed = True
+    for name in list(manifest):
+        if name not in names:
+            del manifest[name]
+            changed = True
+
+    if changed:
+        with open(manifestPath + ".tmp", "w") as f:
+            json.dump(manifest, f, indent=1)
+        os.replace(manifestPath + ".tmp", manifestPath)
+    return manifest
+
+def archivesFor(start=None, end=None, pattern=ARCHIVE_PATTERN, manifestPath=MANIFEST):
+    # --- Archives overlapping [start, end], oldest first ---
+    manifest = updateManifest(pattern, manifestPath)
+    folder = os.path.dirname(pattern)
+    paths = []
+    for name, entry in sorted(manifest.items(), key=lambda kv: kv[1]["min"] or ""):
+        if entry["rows"] == 0:
+            continue
+        if start is not None and pd.Timestamp(entry["max"]) < pd.Timestamp(start):
+            continue
+        if end is not None and pd.Timestamp(entry["min"]) > pd.Timestamp(end):
+            continue
+        paths.append(os.path.join(folder, name))
+    return paths
+
+def lastTimestamp(live=LIVE_CSV, pattern=ARCHIVE_PATTERN, manifestPath=MANIFEST):
+    ends = [pd.Timestamp(e["max"]) for e in updateManifest(pattern, manifestPath).values() if e["max"] is not None]
+    if os.path.exists(live):
+        df = loadCSV(live)
+        if len(df) > 0:
+            ends.append(df["timestamp"].max())
+    return max(ends) if ends else None
+
+def queryChunks(start=None, end=None, confidence_threshold=None, exclude=None, thresholds=None, station=None,
+                chunksize=CHUNKSIZE, live=LIVE_CSV, pattern=ARCHIVE_PATTERN):
+    # --- Filtered detections in [start, end], one chunk at a time ---
+    # The filter is the registry policy (speciesRegistry.filterByPolicy);
+    # station is one station id or a list of them
+    policy = None
+    if confidence_threshold is not None or exclude is not None or thresholds:
+        policy = {"confidence_threshold": -np.inf if confidence_threshold is None else confidence_threshold,
+                  "exclude": exclude or [], "thresholds": thresholds or {}}
+    stations = [station] if isinstance(station, str) else station
+
+    def select(chunk):
+        if start is not None:
+            chunk = chunk[chunk["timestamp"] >= pd.Timestamp(start)]
+        if end is not None:
+            chunk = chunk[chunk["timestamp"] <= pd.Timestamp(end)]
+        if stations is not None and "station" in chunk.columns:
+            chunk = chunk[chunk["station"].isin(stations)]
+        elif stations is not None and DEFAULT_STATION not in stations:
+            chunk = chunk.iloc[:0]
+        if policy is not None:
+            chunk = filterByPolicy(chunk, policy)
+        return chunk
+
+    for path in archivesFor(start, end, pattern):
+        for chunk in pd.read_csv(path, chunksize=chunksize):
+            chunk = select(_parseChunk(chunk))
+            if len(chunk) > 0:
+                yield chunk
+
+    # The live file goes through the incremental CSV cache
+    if os.path.exists(live):
+        df = loadCSV(live)
+        for i in range(0, len(df), chunksize):
+            chunk = select(df.iloc[i:i + chunksize])
+            if len(chunk) > 0:
+                yield chunk
+
+def readRange(start=None, end=None, **kwargs):
+    # --- The selection, built chunk by chunk (filters as queryChunks) ---
+    # Only selected rows are kept, with species as a categorical
+    chunks = [chunk.assign(species=chunk["species"].astype("category")) for chunk in queryChunks(start, end, **kwargs)]
+    if len(chunks) == 0:
+        return _emptyFrame()
+    species = union_categoricals([chunk["species"] for chunk in chunks])
+    df = pd.concat([chunk.drop(columns="species") for chunk in chunks], ignore_index=True)
+    df["species"] = species
+    return df[chunks[0].columns]
+
+def countSpecies(chunks):
+    # --- Detections per species, combined chunk by chunk ---
+    total = pd.Series(dtype="int64")
+    for chunk in chunks:
+        total = total.add(chunk["species"].astype(str).value_counts(), fill_value=0)
+    return total.astype("int64").sort_values(ascending=False)
+
+def countBins(chunks, resolution="day"):
+    # --- Long format (bin, species, count), combined chunk by chunk ---
+    total = None
+    for chunk in chunks:
+        counts = countDetections(chunk, resolution).set_index(["bin", "species"])["count"]
+        total = counts if total is None else total.add(counts, fill_value=0)
+    if total is None:
+        return countDetections(_emptyFrame(), resolution)
+    return total.astype("int64").reset_index()
+
+if __name__ == "__main__":
+    # python archiveQuery.py [START [END]]: species counts over the whole history
+    args = sys.argv[1:] + [None, None]
+    for species, count in countSpecies(queryChunks(args[0], args[1])).items():
+        print(f"{species} — {count}")
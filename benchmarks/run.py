@@ -0,0 +1,133 @@
+import argparse
+import gc
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+import matplotlib
+matplotlib.use("Agg")
+import matplotlib.pyplot as plt
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from synthetic import generateDetections, speciesProfile, writeCSV
+
+# Wall time and peak memory of the analysis functions on synthetic
+# datasets of growing size. Each size runs in its own temporary directory
+# holding data/output.csv (and the store and rollups with --store), so the
+# functions see the same layout as the site build. Results are written to
+# benchmarks/results/<commit>.json; --compare prints the change against an
+# earlier results file.
+RESULTS_DIR = os.path.join(ROOT, "benchmarks", "results")
+SIZES = [1, 7, 30, 365, 730]
+STATS_MINUTES = 60*24*7*60
+
+def benchmarks():
+    # Name -> function of the filterData selection
+    from birdFunctions import (filterData, makeHeatmap, makeDailyCycleHeatmap, shannon_diversity,
+                               overlapMatrix, makeLengthSongPlot, firstCallPlot)
+    return {
+        "filterData": lambda data: filterData(minLim=STATS_MINUTES),
+        "makeHeatmap": lambda data: makeHeatmap(data, timeFrame="week"),
+        "makeDailyCycleHeatmap": makeDailyCycleHeatmap,
+        "shannon_diversity": shannon_diversity,
+        "overlapMatrix": lambda data: overlapMatrix(data.copy()),
+        "makeLengthSongPlot": makeLengthSongPlot,
+        "firstCallPlot": firstCallPlot,
+    }
+
+def _reset():
+    # Every run starts without cached figures
+    shutil.rmtree(os.path.join("data", ".cache", "figures"), ignore_errors=True)
+    plt.close("all")
+    gc.collect()
+
+def measure(fn, data, repeat):
+    times = []
+    for _ in range(repeat):
+        _reset()
+        t = time.perf_counter()
+        fn(data)
+        times.append(time.perf_counter() - t)
+    # Memory in a separate run, tracemalloc slows allocations down
+    _reset()
+    tracemalloc.start()
+    fn(data)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return {"seconds": min(times), "peak_mb": peak / 2**20}
+
+def runSize(days, repeat, store, only, profile):
+    workDir = tempfile.mkdtemp(prefix="birdbench-")
+    cwd = os.getcwd()
+    try:
+        os.makedirs(os.path.join(workDir, "data"))
+        shutil.copy(os.path.join(ROOT, "data", "species.csv"), os.path.join(workDir, "data"))
+        os.chdir(workDir)
+        detections = generateDetections(days, profile=profile)
+        writeCSV(detections, os.path.join("data", "output.csv"))
+        if store:
+            from detectionStore import migrateCSV
+            migrateCSV()
+
+        from birdFunctions import filterData
+        data = filterData(minLim=STATS_MINUTES)
+        results = {}
+        for name, fn in benchmarks().items():
+            if only and name not in only:
+                continue
+            results[name] = measure(fn, data, repeat)
+            print(f"[BENCH] {days:>4}d {len(detections):>9} rows  {name:<22} "
+                  f"{results[name]['seconds'] * 1000:9.1f} ms {results[name]['peak_mb']:8.1f} MB")
+        return {"rows": len(detections), "selected": len(data), "functions": results}
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(workDir, ignore_errors=True)
+
+def commitId():
+    try:
+        out = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True, text=True)
+        return out.stdout.strip() or "unknown"
+    except OSError:
+        return "unknown"
+
+def compare(current, previousPath):
+    with open(previousPath) as f:
+        previous = json.load(f)
+    print(f"[BENCH] compared with {previous['commit']}")
+    for days, result in current["sizes"].items():
+        for name, now in result["functions"].items():
+            before = previous["sizes"].get(days, {}).get("functions", {}).get(name)
+            if before is None:
+                continue
+            print(f"[BENCH] {days:>4}d {name:<22} time x{now['seconds'] / before['seconds']:5.2f}"
+                  f"  memory x{now['peak_mb'] / max(before['peak_mb'], 1e-9):5.2f}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the birdFunctions analyses on synthetic data")
+    parser.add_argument("--days", default=",".join(map(str, SIZES)), help="comma separated dataset sizes in days")
+    parser.add_argument("--repeat", type=int, default=3, help="timed runs per function (fastest is kept)")
+    parser.add_argument("--store", action="store_true", help="migrate into the columnar store and rollups first")
+    parser.add_argument("--only", default="", help="comma separated function names")
+    parser.add_argument("--compare", help="earlier results file to compare with")
+    parser.add_argument("--out", help="results file (default benchmarks/results/<commit>.json)")
+    args = parser.parse_args()
+
+    profile = speciesProfile()
+    only = [name for name in args.only.split(",") if name]
+    current = {"commit": commitId(), "store": args.store, "repeat": args.repeat, "sizes": {}}
+    for days in [int(d) for d in args.days.split(",")]:
+        current["sizes"][str(days)] = runSize(days, args.repeat, args.store, only, profile)
+
+    out = args.out or os.path.join(RESULTS_DIR, f"{current['commit']}{'-store' if args.store else ''}.json")
+    os.makedirs(os.path.dirname(out), exist_ok=True)
+    with open(out, "w") as f:
+        json.dump(current, f, indent=1)
+    print(f"[BENCH] results -> {out}")
+    if args.compare:
+        compare(current, args.compare)
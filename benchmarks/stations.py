@@ -0,0 +1,122 @@
+import argparse
+import json
+import logging
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import urllib.request
+import numpy as np
+import pandas as pd
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "scripts"))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from synthetic import generateDetections, speciesProfile
+
+# Throughput of scripts/ingest_server.py with simulated recorders: every
+# station is a client thread posting one synthetic day of detections in
+# batches, as fast as the server takes them. Without --url the server runs
+# in-process in a temporary directory and the store is checked afterwards
+# (row count, time order, stations).
+#
+#   python benchmarks/stations.py --stations 30
+
+def stationBatches(station, profile, batchRows, perDay):
+    # Each recorder's clock is a little off
+    df = generateDetections(1, perDay=perDay, seed=station, profile=profile)
+    skew = pd.Timedelta(seconds=np.random.default_rng(station).normal(0, 2))
+    df = df.assign(timestamp=(df["timestamp"] + skew).dt.strftime("%Y-%m-%dT%H:%M:%S.%f"))
+    rows = df.to_dict("records")
+    return [rows[i:i + batchRows] for i in range(0, len(rows), batchRows)]
+
+def post(url, station, rows):
+    body = json.dumps({"station": station, "detections": rows}).encode("utf-8")
+    req = urllib.request.Request(url, data=body, headers={"Content-Type": "application/json"})
+    with urllib.request.urlopen(req, timeout=60) as response:
+        return json.load(response)
+
+def runClients(url, batches):
+    latencies = {name: [] for name in batches}
+    errors = []
+
+    def client(name):
+        for rows in batches[name]:
+            t = time.perf_counter()
+            try:
+                post(url, name, rows)
+            except OSError as e:
+                errors.append(str(e))
+            latencies[name].append(time.perf_counter() - t)
+
+    threads = [threading.Thread(target=client, args=(name,)) for name in batches]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return time.perf_counter() - started, np.concatenate([latencies[n] for n in batches]), errors
+
+def startServer(workDir):
+    # The server's paths are relative to scripts/, as when it runs there
+    os.makedirs(os.path.join(workDir, "scripts"))
+    os.makedirs(os.path.join(workDir, "data"))
+    os.chdir(os.path.join(workDir, "scripts"))
+    from werkzeug.serving import make_server
+    logging.getLogger("werkzeug").setLevel(logging.ERROR)
+    import ingest_server
+    server = make_server("127.0.0.1", 0, ingest_server.app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, ingest_server
+
+def checkStore(workDir, expected, stations):
+    from detectionStore import listPartitions, readDetections
+    root = os.path.join(workDir, "data", "store")
+    ordered = all(pd.read_parquet(path, columns=["timestamp"])["timestamp"].is_monotonic_increasing
+                  for _, path in listPartitions(root))
+    df = readDetections(root=root)
+    print(f"[BENCH] store: {len(df)}/{expected} rows, {df['station'].nunique()}/{stations} stations, "
+          f"partitions time-ordered: {ordered}")
+    return len(df) == expected and ordered
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Simulated recorders posting to the ingest server")
+    parser.add_argument("--stations", type=int, default=30)
+    parser.add_argument("--batch-rows", type=int, default=50, help="detections per POST (the recorders' WRITE_BATCH_ROWS)")
+    parser.add_argument("--per-day", type=float, default=None, help="detections per station per day (default: as data/week.csv)")
+    parser.add_argument("--url", help="running ingest server, e.g. http://localhost:4100/ingest")
+    args = parser.parse_args()
+
+    profile = speciesProfile()
+    batches = {f"station-{i:02d}": stationBatches(i, profile, args.batch_rows, args.per_day) for i in range(args.stations)}
+    total = sum(len(rows) for b in batches.values() for rows in b)
+
+    workDir, cwd = None, os.getcwd()
+    try:
+        if args.url is None:
+            workDir = tempfile.mkdtemp(prefix="birdstations-")
+            server, ingest = startServer(workDir)
+            url = f"http://127.0.0.1:{server.port}/ingest"
+        else:
+            url = args.url
+
+        wall, latencies, errors = runClients(url, batches)
+        print(f"[BENCH] {args.stations} stations, {sum(map(len, batches.values()))} batches, {total} detections "
+              f"in {wall:.1f} s = {total / wall:.0f} detections/s")
+        print(f"[BENCH] request latency p50 {np.percentile(latencies, 50) * 1000:.1f} ms, "
+              f"p95 {np.percentile(latencies, 95) * 1000:.1f} ms, max {latencies.max() * 1000:.1f} ms, "
+              f"{len(errors)} errors")
+
+        if workDir is not None:
+            t = time.perf_counter()
+            ingest.merger.close()
+            server.shutdown()
+            print(f"[BENCH] final flush {time.perf_counter() - t:.2f} s; merger {ingest.merger.counts}")
+            checkStore(workDir, total, args.stations)
+    finally:
+        os.chdir(cwd)
+        if workDir is not None:
+            shutil.rmtree(workDir, ignore_errors=True)
@@ -0,0 +1,91 @@
+import os
+import sys
+import numpy as np
+import pandas as pd
+
+# Synthetic detection streams shaped like data/week.csv: the same species
+# mix, per-species activity over the day, bursts of repeated detections
+# (song bouts) and several species detected in the same window.
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PROFILE_CSV = os.path.join(ROOT, "data", "week.csv")
+
+def speciesProfile(path=PROFILE_CSV):
+    # --- Species mix, hour-of-day activity and confidences from a CSV ---
+    df = pd.read_csv(path)
+    df["timestamp"] = pd.to_datetime(df["timestamp"], format="ISO8601")
+    df = df.dropna()
+    counts = df["species"].value_counts()
+    species = counts.index.to_numpy()
+
+    # Hourly activity per species, blended with the overall curve so rare
+    # species are not limited to the hours they happened to be heard in
+    hours = df.groupby([df["species"], df["timestamp"].dt.hour]).size().unstack(fill_value=0)
+    hours = hours.reindex(index=species, columns=range(24), fill_value=0).to_numpy(dtype=float)
+    overall = hours.sum(axis=0) + 1
+    activity = hours + 5 * overall / overall.sum()
+    activity /= activity.sum(axis=1, keepdims=True)
+
+    confidence = df.sort_values("species")
+    days = max((df["timestamp"].max() - df["timestamp"].min()) / pd.Timedelta("1D"), 1)
+    return {
+        "species": species,
+        "mix": (counts / counts.sum()).to_numpy(),
+        "activity": np.cumsum(activity, axis=1),
+        "confidence": confidence["confidence"].to_numpy(),
+        "confidenceStart": np.searchsorted(confidence["species"].to_numpy(), species),
+        "confidenceCount": confidence.groupby("species").size().reindex(species).to_numpy(),
+        "perDay": len(df) / days,
+    }
+
+def generateDetections(days, start="2024-01-01", perDay=None, burstMean=4.0, burstGap=20.0,
+                       coDetect=0.15, seed=0, profile=None):
+    # --- Detections (timestamp, species, confidence) for `days` days ---
+    rng = np.random.default_rng(seed)
+    profile = speciesProfile() if profile is None else profile
+    perDay = profile["perDay"] if perDay is None else perDay
+    nSpecies = len(profile["species"])
+
+    # Burst starts: species from the mix, hour from that species' activity
+    events = rng.poisson(perDay * days / (burstMean * (1 + coDetect)))
+    species = rng.choice(nSpecies, size=events, p=profile["mix"])
+    hour = (profile["activity"][species] < rng.random(events)[:, None]).sum(axis=1).clip(max=23)
+    seconds = rng.integers(0, days, events) * 86400 + hour * 3600 + rng.random(events) * 3600
+
+    # Every burst repeats its species with short gaps
+    sizes = rng.geometric(1 / burstMean, events)
+    species = np.repeat(species, sizes)
+    gaps = rng.exponential(burstGap, len(species))
+    firsts = np.cumsum(sizes) - sizes
+    gaps[firsts] = 0
+    offsets = np.cumsum(gaps)
+    offsets -= np.repeat(offsets[firsts], sizes)
+    seconds = np.repeat(seconds, sizes) + offsets
+
+    # Some windows also detect a second species
+    extra = rng.random(len(species)) < coDetect
+    seconds = np.concatenate([seconds, seconds[extra]])
+    species = np.concatenate([species, rng.choice(nSpecies, size=extra.sum(), p=profile["mix"])])
+
+    # Confidence drawn from the species' own observed confidences
+    pick = profile["confidenceStart"][species] + (rng.random(len(species)) * profile["confidenceCount"][species]).astype(int)
+    confidence = (profile["confidence"][pick] + rng.normal(0, 0.02, len(species))).clip(0.1, 1.0)
+
+    order = np.argsort(seconds, kind="stable")
+    timestamps = pd.Timestamp(start) + pd.to_timedelta(seconds[order], unit="s")
+    return pd.DataFrame({
+        "timestamp": timestamps,
+        "species": profile["species"][species[order]],
+        "confidence": confidence[order],
+    })
+
+def writeCSV(df, path):
+    # Same text format as the dashboard writes
+    df.assign(timestamp=df["timestamp"].dt.strftime("%Y-%m-%d %H:%M:%S.%f")).to_csv(path, index=False)
+
+if __name__ == "__main__":
+    # python benchmarks/synthetic.py DAYS OUT.csv [SEED]
+    days, out = int(sys.argv[1]), sys.argv[2]
+    seed = int(sys.argv[3]) if len(sys.argv) > 3 else 0
+    df = generateDetections(days, seed=seed)
+    writeCSV(df, out)
+    print(f"{len(df)} detections, {df['species'].nunique()} species, {days} days -> {out}")
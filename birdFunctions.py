@@ -2,90 +2,117 @@ import pandas as pd
 from datetime import datetime, timedelta
 import matplotlib.pyplot as plt
 import numpy as np
-
-exclude = ["Dog", "Human non-vocal", "Engine", "Human vocal",
-           "Trompetzwaan", "Viskraai", "Waaierhoen", "Prairiehoen",
-           "Elzenfeetiran", "Amerikaanse Nachtzwaluw", "Cederpestvogel",
-           "Casarca", "Cassins Vireo", "Blonde Ruiter", "Kleine Torenvalk",
-           "Gevlekte Diamantvogel", "Geelstuitdoornsnavel", "Gestreepte Bosuil",
-           "Hoatzin", "Kleine Kauailijster", "Oeraluil", "Roodkapzanger", "Pinyongaai",
-           "Rosse Bladspeurder", "Oehoe", "Gray Wolf", "Amerikaanse Oehoe",
-           "Ponderosadwergooruil", "Rotsduif", "Porseleinhoen", "Roerdomp",
-           "Amerikaanse Woudaap", "Geelkopamazone", "Zwarte Dwergral", "Southern Boobook",
-           "Roodkopspecht", "Lesson's Motmot", "Chinese Spoorkoekoek", "Berkenfeetiran",
-           "Canadese Boomklever", "Avonddikbek", "Japanse Koolmees", "Carolina-eend",
-           "Haakbek", "Grijze Mees", "Fireworks", "Verreaux' Duif", "Europese Kanarie",
-           "Zwarte Zijdevliegenvanger", "Zeledonia", "Zaaguil", "Witbandsijs",
-           "Taigavliegenvanger", "Says Phoebe", "Purperkeelvruchtenkraai", "Tropische Koningstiran",
-           "Oesserifitis", "Nuttalls Specht", "Maskergeelvink", "Mantsjoerijse Woudaap", "Louisianatangare",
-           "Mexicaanse Roodmus", "Oost-Amerikaanse Winterkoning", "Spaanse Mus", "Maskertroepiaal", "Alpengierzwaluw", "Bicknells Dwerglijster", "Blauwkeelsialia",
-           "Kleine Zwaan", "Dwerggors", "Carolinamees", "Kleine Geelpootruiter", "Goudsijs", "Amerikaanse Matkop",
-           "Bergsolitaire", "Barking Treefrog", "Bells Gors", "American Bullfrog", "Huttons Vireo",
-           "Kaapse Krombek", "Eikelspecht", "Cassins Koningstiran", "Dwergooruil", "Canadese Zanger",
-           "Bruinkapstruikgors", "Dikbekkraai", "Gestreepte Vliegenvanger", "Himalayan Shrike-Babbler",
-           "Geelgroene Vireo", "Geelkeelzanger", "Ekstergaai", "Grijskeeltiran", "Grijspootsjakohoen", "Kastanjerugmees", "Grote Renkoekoek", "Power tools", "Phoebe",
-           "Roodkeelsialia", "Grijze Vireo", "Bootsnaveltiran", "Roodoogvireo", "Orpheusspotvogel",
-           "Zijdestaart", "Gestreepte Vechtkwartel", "Geelbuiksapspecht", "Zanggors", "Oriental Magpie",
-           "Geelkeelvliegenpikker", "Koningstiran", "Coyote", "Glanstroepiaal", "Amerikaanse Boomkruiper",
-           "Roodbuikzanger", "Zwarte Troepiaal", "Geelsnavelkoekoek", "Geelkoptroepiaal", "Purperzwaluw",
-           "Treurtortel", "Zuid-Aziatische Valkuil", "Amerikaanse Boslijster", "Blacksmith Thrush",
-           "Grote Valkuil", "Grote Bosvalk", "Grote Geelkuifkaketoe", "Indische Dwergooruil", "Kanarie",
-           "Pacifische Waterpieper", "Oostelijke Schreeuwuil", "Hawaiikraai", "Withalsvliegenvanger",
-           "Sneeuwgors", "Californische Towie", "Alpenkraai", "Epauletspreeuw", "Wigstaartpijlstormvogel",
-           "Wilgenfeetiran", "Westelijke Schreeuwuil", "Zwartsnavelkoekoek", "Oessoerifitis",
-           "Grote Geelpootruiter", "Grote Pieper", "Indische Kwak", "Braziliaanse Bosuil",
-           "Brahmaanse Wouw", "Griel", "Bruine Gaai", "Breedstaartzanger", "Cassins Roodmus",
-           "Cabanis's Wren", "Bronsvleugelduif", "Harlekijnmees", "Hawaiikruiper", "Hellmayrs Pieper",
-           "Hooglandpieper", "Goudsnip", "Graceful Prinia", "Bergelenia", "Witwangstern",
-           "Dennengors", "Witkeelschreeuwuil", "Amerikaanse Bosruiter", "Amerikaanse Blauwe Reiger",
-           "Amerikaanse Houtsnip", "Australische Brilvogel", "Amerikaanse Slangenhalsvogel",
-           "Amerikaanse Zeearend", "Blafuil", "Australische Raaf", "Dwergara", "Gestreepte Koekoek",
-           "Gewone Neushoornvogel", "Dubbelhoornige Neushoornvogel", "Forsters Stern",
-           "Chileense Spotlijster", "Grijze Kardinaal", "Grijze Gors", "Grijsbuik-Piet-van-Vliet",
-           "Grijze Kruiper", "Japanse Fitis", "Kaapse Grasvogel", "Katvogel", "Huiswinterkoning",
-           "Roodvoorhoofdkanarie", "Perzikkopagapornis", "Purpergors", "Picuiduif",
-           "Pieperstruiksluiper", "Kortteenleeuwerik", "Kleine Feetiran", "Malabartok",
-           "Langstaartmanakin", "Lucy's Zanger", "Laughing Dove", "Muskaatvink", "Monniksparkiet",
-           "Mangrovepitta", "Noddy", "Noordamerikaanse Dwerguil", "Noord-Aziatische Valkuil",
-           "Olive-striped Flycatcher (Olive-streaked)", "Oostelijke Bospiewie", "Kleine Grijze Snip",
-           "Roodstaartkeerkringvogel", "Roodschouderbuizerd", "Roodnek-winterkoning",
-           "Roodkapprinia", "Roestkruingors", "Roodbuikspecht", "Roodbuikspotlijster",
-           "Bloedtangare", "Rotsmus", "Snornachtegaal", "Soendadwergooruil", "Rosse Boomekster",
-           "Schoorsteengierzwaluw", "Blauwkaporganist", "Blauwe Ekster", "Blauwbandarassari",
-           "Timorese Helmlederkop", "Toendragors", "Treurduif", "Tuintroepiaal", "Vlekduif",
-           "Zwartkopsaltator", "Zwartrugspecht", "Tenerifepimpelmees", "Coopers Sperwer",
-           "Auerhoen", "Loodbekje", "Grauw Sneeuwhoen", "Geelrugtroepiaal", "Bruinkapbergvink",
-           "Afrikaanse Bonte Kwikstaart", "Blauwfazantje", "Rode Kardinaal", "Sneeuwbuikamazilia",
-           "Jungleprinia", "Bruinrugsolitaire", "Blauwe Nachtegaal", "Gambels Kuifkwartel",
-           "Bonte Gierzwaluw", "Struikorganist", "Roodstaartbuizerd", "Siberische Boompieper",
-           "Geelborstvireo", "Geelbekdwerglijster", "Blauwkopbosijsvogel", "Amerikaanse Kraai",
-           "Amerikaanse Goudhaan", "Akohekohe", "Breedvleugelbuizerd", "Afrikaanse Bosuil",
-           "Apolinars Winterkoning", "Amerikaanse Oeverloper", "Okerattila", "Musduif",
-           "Mandarijneend", "Kaapse Loofbuulbuul", "Kalkoen", "Grauwe Tinamoe", "Grote Nachtzwaluw",
-           "Heremietlijster", "Humes Bladkoning", "Indische Slangenarend", "Scarlet-rumped Tanager",
-           "Roodbrauwwinterkoning", "Peruaanse Treurduif", "Siren", "Struikmees", "Struikfeetiran"]
+from detectionStore import DEFAULT_STATION, hasStore, lastTimestamp, readDetections
+from csvCache import loadCSV
+from archiveQuery import readRange, lastTimestamp as archiveLastTimestamp
+from shardStore import hasShards, readShards, lastTimestamp as shardLastTimestamp
+from diversity import countMatrix, hourOfDayMatrix, shannon
+from cooccurrence import CooccurrenceStats
+from rollups import ensureRollups, readMeta, readCube, readCalls, countCalls, countDetections, isAligned, rebin
+from dawnChorus import medianFirstCall, sunriseOffset
+from figureCache import cachedFigure, fitMargins, newFigure, showFigure
+from bouts import ensureBouts, readBouts, segmentBouts
+from speciesRegistry import SpeciesRegistry
+
+# Species labels, codes and the include/exclude/threshold policy live in
+# data/species.csv
+registry = SpeciesRegistry.load()
+exclude = registry.excluded()
+thresholds = registry.thresholds()
 
 def readCSV():
-    df = pd.read_csv("data/output.csv")
-    df['timestamp'] = pd.to_datetime(df['timestamp'])
-    return df
-
-def filterData(minLim=60, confidence_threshold=0.7):
+    # Only the rows appended since the previous call are parsed
+    return loadCSV("data/output.csv")
+
+def selectStation(df, station=None):
+    # --- Detections of one station id or a list of them (None: all stations) ---
+    if station is None:
+        return df
+    if "station" not in df.columns:
+        df = df.assign(station=DEFAULT_STATION)
+    return df[df["station"].isin([station] if isinstance(station, str) else station)]
+
+def loadDetections(minLim=60, station=None, policy=None):
+    # --- Detections of the last minLim minutes and the start of that frame ---
+    # The CSV archives are filtered by `policy` (as SpeciesRegistry.policy)
+    # while they are read, so only the selection is held in memory
+    if hasStore():
+        # Only the partitions inside the time frame are read
+        endTime = (lastTimestamp() - pd.Timedelta(minutes=2)).ceil("60min")
+        timeFrame = endTime - timedelta(minutes=minLim)
+        df_selection = readDetections(start=timeFrame, station=station)
+    elif hasShards():
+        # The committed day shards (e.g. in CI, where there is no store)
+        endTime = (shardLastTimestamp() - pd.Timedelta(minutes=2)).ceil("60min")
+        timeFrame = endTime - timedelta(minutes=minLim)
+        df_selection = readShards(start=timeFrame, station=station)
+    else:
+        # output.csv plus the rotated archives inside the time frame
+        endTime = (archiveLastTimestamp() - pd.Timedelta(minutes=2)).ceil("60min")
+        timeFrame = endTime - timedelta(minutes=minLim)
+        df_selection = readRange(start=timeFrame, station=station, **(policy or {}))
+    return df_selection, timeFrame
+
+def applyFilters(df_selection, confidence_threshold=0.7):
+    # --- Filter high confidence and excluded species ---
+    # The threshold of each detection is a gather from the registry's
+    # compiled per-code array (excluded species: +inf)
+    if not isinstance(df_selection['species'].dtype, pd.CategoricalDtype):
+        df_selection = df_selection.assign(species=df_selection['species'].astype('category'))
+    df_selection = df_selection[registry.keep(df_selection, confidence_threshold)]
+    return df_selection.assign(species=df_selection['species'].cat.remove_unused_categories())
+
+def filterData(minLim=60, confidence_threshold=0.7, station=None):
     # --- Filter last hour ---
-    df = readCSV()
-    endTime = (df['timestamp'].iloc[-1] - pd.Timedelta(minutes=2)).ceil("60min")
-    timeFrame = endTime - timedelta(minutes=minLim)
-    df_selection = df[df['timestamp'] >= timeFrame]
-    # --- Filter high confidence ---
-    df_selection = df_selection[df_selection['confidence'] > confidence_threshold]
-    df_selection = df_selection[~df_selection['species'].isin(exclude)]
+    df_selection, timeFrame = loadDetections(minLim, station, registry.policy(confidence_threshold))
+    df_selection = applyFilters(df_selection, confidence_threshold)
+    # The cubes count all stations together
+    if station is None:
+        attachRollups(df_selection, timeFrame, confidence_threshold)
     return df_selection
 
+def attachRollups(df_selection, timeFrame, confidence_threshold=0.7):
+    # --- Mark the selection as answerable from the rollup cubes ---
+    if not hasStore():
+        return
+    root = ensureRollups(confidence_threshold, exclude, thresholds=thresholds)
+    cube = "hour" if isAligned(timeFrame, "hour") else "5min"
+    if not isAligned(timeFrame, cube):
+        return
+    # The cubes must hold exactly the selected detections
+    if readCube(cube, start=timeFrame, root=root)["count"].sum() == len(df_selection):
+        df_selection.attrs["rollup"] = {"start": str(timeFrame), "rows": len(df_selection), "root": root}
+
+def _fromRollups(data):
+    # Only an unmodified filterData selection can be read from the cubes
+    info = data.attrs.get("rollup")
+    return info is not None and info["rows"] == len(data)
+
+def binCounts(data, resolution):
+    # --- Long format (bin, species, count) at "5min", "hour" or "day" ---
+    if _fromRollups(data):
+        start = data.attrs["rollup"]["start"]
+        # Coarsest cube that starts exactly at the selection start
+        for cube in ["day", "hour", "5min"][["day", "hour", "5min"].index(resolution):]:
+            if isAligned(start, cube):
+                return rebin(readCube(cube, start=start, root=data.attrs["rollup"]["root"]), resolution)
+    return countDetections(data, resolution)
+
 def aggregateData(df_selection):
     # --- Aggregate by species ---
+    if _fromRollups(df_selection):
+        counts = binCounts(df_selection, "hour").groupby("species")["count"].sum()
+        return counts.reset_index(name="count").sort_values("count", ascending=False).reset_index(drop=True)
     agg_data = df_selection.groupby("species").size().reset_index(name="count").sort_values("count", ascending=False).reset_index(drop=True) 
     return agg_data
 
+def stationCounts(df_selection):
+    # --- Detections per species (rows) and station (columns) ---
+    if "station" not in df_selection.columns:
+        df_selection = df_selection.assign(station=DEFAULT_STATION)
+    counts = df_selection.groupby(["species", "station"], observed=True).size().unstack(fill_value=0)
+    return counts.loc[counts.sum(axis=1).sort_values(ascending=False).index]
+
 def groupByMinute(df):
     # --- Group by minute ---
     stats = df.groupby(df['timestamp'].dt.minute).size()
@@ -94,47 +121,48 @@ def groupByMinute(df):
 
 def groupByHour(df):
     # --- Group by hour ---
-    stats = df.groupby(df['timestamp'].dt.hour).size()
+    if _fromRollups(df):
+        counts = binCounts(df, "hour")
+        stats = counts.groupby(counts["bin"].dt.hour.rename("timestamp"))["count"].sum()
+    else:
+        stats = df.groupby(df['timestamp'].dt.hour).size()
     stats = (stats.reindex(range(24), fill_value=0))
     return stats
 
 def groupByDay(df):
     # --- Group by day ---
+    if _fromRollups(df):
+        counts = binCounts(df, "day")
+        return counts.groupby(counts["bin"].dt.date.rename("timestamp"))["count"].sum()
     stats = df.groupby(df['timestamp'].dt.date).size()
     return stats
 
-def makeHeatmap(data, timeFrame="5min"):
-    # Convert timestamps to minute resolution
+def heatmapFrame(data, timeFrame="5min"):
     # Determine the last hour time range
     if timeFrame == "5min":
-        data["minute"] = data["timestamp"].dt.floor(timeFrame)
         end_time = (data['timestamp'].iloc[-1] - pd.Timedelta(minutes=5)).ceil("60min")
         start_time = end_time - pd.Timedelta(minutes=65) + pd.Timedelta(minutes=5)
         all_blocks = pd.date_range(start=start_time, end=end_time, freq=timeFrame)
     elif timeFrame == "hour":
-        data["minute"] = data["timestamp"].dt.floor("60min")
         end_time = (data['timestamp'].iloc[-1] - pd.Timedelta(minutes=5)).ceil("60min")
         start_time = end_time - pd.Timedelta(minutes=60*24) + pd.Timedelta(minutes=60)
         all_blocks = pd.date_range(start=start_time, end=end_time, freq="60min")
     elif timeFrame == "day":
-        data["minute"] = data["timestamp"].dt.floor("1440min")
         end_time = (data['timestamp'].iloc[-1] - pd.Timedelta(minutes=5)).floor("1440min")
         start_time = end_time - pd.Timedelta(minutes=60*24*7) + pd.Timedelta(minutes=60*24)
         all_blocks = pd.date_range(start=start_time, end=end_time, freq="1440min")
     elif timeFrame == "week":
-        data["minute"] = data["timestamp"].dt.floor("1440min")
         end_time = (data['timestamp'].iloc[-1] - pd.Timedelta(minutes=5)).floor("1440min")
-        start_time = data["timestamp"].dt.floor("1440min").min()
+        start_time = data["timestamp"].min().floor("1440min")
         all_blocks = pd.date_range(start=start_time, end=end_time, freq="1440min")
 
+    # Species × bin counts from the rollup cubes (or the raw detections)
+    counts = binCounts(data, {"5min": "5min", "hour": "hour", "day": "day", "week": "day"}[timeFrame])
 
     # Create pivot: species (rows) × minute (columns)
     heatmap_data = (
-        data
-        .groupby(["species", "minute"])
-        .size()
-        .reset_index(name="count")
-        .pivot(index="species", columns="minute", values="count")
+        counts
+        .pivot(index="species", columns="bin", values="count")
         .reindex(columns=all_blocks)   # ensures 12 blocks
         .fillna(np.nan)
     )
@@ -142,72 +170,69 @@ def makeHeatmap(data, timeFrame="5min"):
     heatmap_data = heatmap_data.loc[
         heatmap_data.sum(axis=1).sort_values(ascending=True).index
     ]
+    return heatmap_data
+
+def makeHeatmap(data, timeFrame="5min"):
+    plotHeatmap(heatmapFrame(data, timeFrame), timeFrame)
+
+def drawHeatmap(heatmap_data, timeFrame="5min"):
     heatmap_normalized = heatmap_data.div(heatmap_data.max(axis=1), axis=0)
 
     # Convert to matrix form for matplotlib
     heat_matrix = heatmap_normalized.values
 
     # Create figure
-    if timeFrame == "5min": plt.figure(figsize=(5, 6))
-    if timeFrame == "hour": plt.figure(figsize=(5, 16))
-    if timeFrame == "day": plt.figure(figsize=(5, 16))
-    if timeFrame == "week": plt.figure(figsize=(5, 30))
+    figsize = {"5min": (5, 6), "hour": (5, 16), "day": (5, 16), "week": (5, 30)}[timeFrame]
+    fig = newFigure(figsize)
+    ax = fig.add_subplot()
 
     # ---- PLOT WITH MATPLOTLIB ONLY ----
-    plt.imshow(heat_matrix, aspect="auto", vmin=0, vmax=1, cmap="Blues", origin="lower")
-
-    # Add colorbar
-    #plt.colorbar(label="Observation Count")
+    ax.imshow(heat_matrix, aspect="auto", vmin=0, vmax=1, cmap="Blues", origin="lower", interpolation="nearest")
 
     # Tick labels
-    if timeFrame == "5min": plotLabels = [m.strftime("%H:%M") for m in heatmap_data.columns]
-    elif timeFrame == "hour": plotLabels = [m.strftime("%H:%M") for m in heatmap_data.columns]
-    elif timeFrame == "day": plotLabels = [m.strftime("%D") for m in heatmap_data.columns]
-    elif timeFrame == "week": plotLabels = [m.strftime("%D") for m in heatmap_data.columns]
-    plt.xticks(
-        ticks=range(len(heatmap_data.columns)),
-        labels=plotLabels,
-        rotation=45,
-        ha="right"
-    )
-    plt.yticks(
-        ticks=range(len(heatmap_data.index)),
-        labels=["%s %d" % (species, total) for species, total in zip(heatmap_data.index, heatmap_data.sum(axis=1))]
-    )
-    plt.title("Species Presence Heatmap")
-    plt.tight_layout()
-    plt.show()
+    if timeFrame in ("5min", "hour"): plotLabels = [m.strftime("%H:%M") for m in heatmap_data.columns]
+    else: plotLabels = [m.strftime("%D") for m in heatmap_data.columns]
+    yLabels = ["%s %d" % (species, total) for species, total in zip(heatmap_data.index, heatmap_data.sum(axis=1))]
+    ax.set_xticks(range(len(heatmap_data.columns)), plotLabels, rotation=45, ha="right")
+    ax.set_yticks(range(len(heatmap_data.index)), yLabels)
+    ax.set_title("Species Presence Heatmap")
+    fitMargins(fig, yLabels, plotLabels)
+    return fig
+
+def plotHeatmap(heatmap_data, timeFrame="5min", fmt="png"):
+    # Rendered once per distinct matrix, then served from the figure cache
+    return showFigure(cachedFigure(drawHeatmap, heatmap_data, fmt=fmt, timeFrame=timeFrame), fmt)
+
+def diversityFrame(data):
+    # Species x hour counts (from the rollup cubes when possible), pooled by hour of day
+    matrix = hourOfDayMatrix(countMatrix(binCounts(data, "hour")))
+    return shannon(matrix).reset_index()
 
 def shannon_diversity(data):
-    data['hour_of_day'] = data['timestamp'].dt.hour
-
-    hour_groups = data.groupby('hour_of_day')['species'].apply(list)
-    diversity = hour_groups.apply(diversityLoop)
+    plotDiversity(diversityFrame(data))
 
+def plotDiversity(diversity):
     # Plot
     plt.figure(figsize=(5,5))
-    diversity.plot()
+    diversity.set_index("hour_of_day")["shannon"].plot()
     plt.xlabel('Hour')
     plt.ylabel('Acoustic Diversity')
     plt.title('')
     plt.show()
 
-def diversityLoop(species_list):
-    counts = pd.Series(species_list).value_counts()
-    freqs = counts / counts.sum()
-    return -np.sum(freqs * np.log2(freqs))
-
-def makeDailyCycleHeatmap(data):
-    # Convert timestamp to hour of day
-    data['hour_of_day'] = data['timestamp'].dt.hour
-
-    # Count calls per species per hour
-    heatmap_data = data.groupby(['species', 'hour_of_day']).size().unstack(fill_value=0)
+def dailyCycleFrame(data):
+    # Count calls per species per hour of day
+    counts = binCounts(data, "hour")
+    heatmap_data = counts.groupby(['species', counts['bin'].dt.hour.rename('hour_of_day')])['count'].sum().unstack(fill_value=0)
     heatmap_data.loc["Total"] = heatmap_data.sum(axis=0)
     # Order species by total occurrence (descending)
     species_order = heatmap_data.sum(axis=1).sort_values(ascending=True).index
-    heatmap_data = heatmap_data.reindex(species_order)
+    return heatmap_data.reindex(species_order)
+
+def makeDailyCycleHeatmap(data):
+    plotDailyCycleHeatmap(dailyCycleFrame(data))
 
+def drawDailyCycleHeatmap(heatmap_data):
     # Normalize per species for better visualization
     heatmap_normalized = heatmap_data.div(heatmap_data.max(axis=1), axis=0)
 
@@ -218,42 +243,43 @@ def makeDailyCycleHeatmap(data):
     heat_matrix = heatmap_normalized.values
 
     # Plot
-    plt.figure(figsize=(5,30))
-    plt.imshow(heat_matrix, aspect='auto', cmap='Blues', origin='lower')
+    fig = newFigure((5, 30))
+    ax = fig.add_subplot()
+    ax.imshow(heat_matrix, aspect='auto', cmap='Blues', origin='lower', interpolation='nearest')
 
     # X-axis: hours
     x_labels = [f"{int(t):02d}:00" for t in heatmap_normalized.columns]
-    plt.xticks(ticks=range(len(heatmap_normalized.columns)), labels=x_labels, rotation=45, ha='right')
+    ax.set_xticks(range(len(heatmap_normalized.columns)), x_labels, rotation=45, ha='right')
 
     # Y-axis: species names + total counts
     y_labels = [f"{species} ({int(total)})" for species, total in zip(heatmap_normalized.index, heatmap_data.sum(axis=1))]
-    plt.yticks(ticks=range(len(heatmap_normalized.index)), labels=y_labels)
-
-    plt.title("Daily Cycle Heatmap")
-    plt.xlabel("Hour of Day")
-    plt.tight_layout()
-    plt.show()
-
-def makeLengthSongPlot(data):
-    df = data.sort_values(['species', 'timestamp'])
-
-    # Time difference between consecutive detections
-    df['delta'] = df.groupby('species')['timestamp'].diff().dt.total_seconds()
-
-    # Define new bout if gap > threshold (e.g. 300 sec)
-    threshold = 300
-    df['new_bout'] = (df['delta'] > threshold) | (df['delta'].isna())
-
-    df['bout_id'] = df.groupby('species')['new_bout'].cumsum()
-
-    bouts = df.groupby(['species', 'bout_id']).agg(
-        start=('timestamp', 'min'),
-        end=('timestamp', 'max'),
-        count=('timestamp', 'size')
-    ).reset_index()
-
-    bouts['duration'] = (bouts['end'] - bouts['start']).dt.total_seconds()
-
+    ax.set_yticks(range(len(heatmap_normalized.index)), y_labels)
+
+    ax.set_title("Daily Cycle Heatmap")
+    ax.set_xlabel("Hour of Day")
+    fitMargins(fig, y_labels, x_labels)
+    return fig
+
+def plotDailyCycleHeatmap(heatmap_data, fmt="png"):
+    return showFigure(cachedFigure(drawDailyCycleHeatmap, heatmap_data, fmt=fmt), fmt)
+
+def boutFrame(data, threshold=300):
+    # Bouts: detections of a species at most `threshold` seconds apart
+    if _fromRollups(data):
+        root = data.attrs["rollup"]["root"]
+        meta = readMeta(root)
+        ensureBouts(meta["confidence_threshold"], meta["exclude"], threshold, rows=readCube("day", root=root)["count"].sum(),
+                    thresholds=meta.get("thresholds"))
+        bouts = readBouts(start=data.attrs["rollup"]["start"])
+    else:
+        bouts = segmentBouts(data, threshold)
+        bouts['duration'] = (bouts['end'] - bouts['start']).dt.total_seconds()
+    return bouts
+
+def makeLengthSongPlot(data, threshold=300):
+    plotBoutLengths(boutFrame(data, threshold))
+
+def plotBoutLengths(bouts):
     # Plot distribution
     plt.hist(bouts['duration'], bins=50, log=True)
     plt.title("Bout duration distribution (Log Scale)")
@@ -261,15 +287,16 @@ def makeLengthSongPlot(data):
     plt.ylabel("Frequency (Log Scale)")
     plt.show()
 
-def overlapMatrix(data):
-    data['time_bin_15'] = data['timestamp'].dt.floor('15min')
-    top_species = data['species'].value_counts().head(15).index
-    data = data[data['species'].isin(top_species)]
-
-    interaction = data.groupby(['time_bin_15', 'species']).size().unstack(fill_value=0)
+def overlapFrame(data):
+    # Correlation of 15 minute counts, from the all-species sparse statistics
+    stats = CooccurrenceStats("15min").add(data)
+    return stats.correlation(stats.topSpecies(15))
 
-    corr = interaction.corr()
+def overlapMatrix(data):
+    plotOverlap(overlapFrame(data))
 
+def plotOverlap(corr):
+    corr = corr.copy()
     # Remove diagonal values (set to NaN)
     corr[corr > 0.99] = np.nan
 
@@ -281,27 +308,45 @@ def overlapMatrix(data):
     plt.title("Species correlation matrix (without diagonal)")
     plt.show()
 
-def firstCallPlot(data):
-    top_species = data['species'].value_counts().head(30).index
-    data = data[data['species'].isin(top_species)]
-
-    data['date'] = data['timestamp'].dt.date
-    first_calls = data.sort_values('timestamp').groupby(['date', 'species']).first().reset_index()
-
-    # Convert to hour
-    first_calls['first_time'] = first_calls['timestamp'].dt.hour + first_calls['timestamp'].dt.minute/60
-
-    # Calculate average first call time per species
-    avg_first_calls = first_calls.groupby('species')['first_time'].median().reset_index()
-
-    # Plot
+def dailyCallFrame(data):
+    # --- First/last call per (date, species) ---
+    if _fromRollups(data):
+        start = pd.Timestamp(data.attrs["rollup"]["start"])
+        calls = readCalls(start=start.ceil("1D"), root=data.attrs["rollup"]["root"])
+        # A partial first day comes from the selection itself
+        if start != start.ceil("1D"):
+            calls = pd.concat([countCalls(data[data["timestamp"] < start.ceil("1D")]), calls], ignore_index=True)
+        return calls.assign(species=calls["species"].astype(str))
+    return countCalls(data)
+
+def firstCallFrame(data, location=None):
+    # --- Median first call per top species: hour of day, or minutes after sunrise ---
+    # location: optional (latitude, longitude, timezone) for first calls relative to sunrise
+    calls = dailyCallFrame(data)
+    top_species = calls.groupby("species")["count"].sum().sort_values(ascending=False, kind="stable").head(30).index
+
+    if location is None:
+        avg_first_calls = medianFirstCall(calls, top_species)
+    else:
+        offsets = sunriseOffset(calls[calls["species"].isin(top_species)], *location)
+        avg_first_calls = offsets.groupby("species")["offset"].median().reset_index(name="first_time")
+    return avg_first_calls
+
+def firstCallPlot(data, location=None):
+    plotFirstCalls(firstCallFrame(data, location), relative=location is not None)
+
+def plotFirstCalls(avg_first_calls, relative=False):
+    # relative: first_time is in minutes after sunrise
     avg_first_calls = avg_first_calls.sort_values('first_time', ascending=False)
 
     plt.figure(figsize=(5, len(avg_first_calls) * 0.5))
     plt.barh(avg_first_calls['species'], avg_first_calls['first_time'], color='skyblue')
-    plt.xlabel("First singing time (hour)")
     plt.ylabel("Species")
     plt.title("Dawn chorus timing")
-    plt.xticks(range(0, 25,2))  # Set x-axis ticks to integers from 0 to 24
+    if not relative:
+        plt.xlabel("First singing time (hour)")
+        plt.xticks(range(0, 25,2))  # Set x-axis ticks to integers from 0 to 24
+    else:
+        plt.xlabel("First singing time (minutes after sunrise)")
     plt.grid(axis='x', linestyle='--', alpha=0.7)
     plt.show()
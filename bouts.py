@@ -0,0 +1,246 @@
+import glob
+import json
+import os
+import shutil
+import numpy as np
+import pandas as pd
+from detectionStore import STORE_DIR, listPartitions, readDetections
+from rollups import filterDetections
+from writeLock import writeLock
+
+# Song bouts: runs of detections of one species where consecutive
+# detections are at most `gap` seconds apart.
+#   data/bouts/YYYY-MM.parquet  closed bouts (species, start, end, count, max_confidence)
+#                               by the month they start in
+#   data/bouts/state.json       gap, filter, open bouts and the last detection seen
+# Detections are added as they are written; the newest bout per species
+# stays open until a later detection (of any species) is more than `gap`
+# after its end. The filter is the same as for the rollup cubes.
+BOUT_DIR = "data/bouts"
+BOUT_GAP = 300
+
+def _boutsPath(root, month):
+    return os.path.join(root, "%s.parquet" % month)
+
+def _legacyPath(root):
+    # The single table of before the month partitions
+    return os.path.join(root, "bouts.parquet")
+
+def _statePath(root):
+    return os.path.join(root, "state.json")
+
+def _emptyBouts():
+    return pd.DataFrame({
+        "species": pd.Series([], dtype="object"),
+        "start": pd.Series([], dtype="datetime64[ns]"),
+        "end": pd.Series([], dtype="datetime64[ns]"),
+        "count": pd.Series([], dtype="int64"),
+        "max_confidence": pd.Series([], dtype="float64"),
+    })
+
+def _asBouts(df):
+    # Every detection as a bout of its own
+    ts = pd.to_datetime(df["timestamp"])
+    return pd.DataFrame({
+        "species": df["species"].astype(str).to_numpy(),
+        "start": ts.to_numpy(),
+        "end": ts.to_numpy(),
+        "count": np.ones(len(df), dtype="int64"),
+        "max_confidence": df["confidence"].to_numpy(dtype="float64"),
+    })
+
+def mergeBouts(bouts, gap=BOUT_GAP):
+    # --- Join bouts of a species that are at most `gap` seconds apart ---
+    if len(bouts) == 0:
+        return _emptyBouts()
+    bouts = bouts.sort_values(["species", "start"], kind="stable")
+    species = bouts["species"].to_numpy()
+    start = bouts["start"].to_numpy()
+    # Running end, so a bout that covers later ones keeps them joined
+    end = bouts.groupby("species", sort=False)["end"].cummax().to_numpy()
+    new = np.ones(len(bouts), dtype=bool)
+    new[1:] = (species[1:] != species[:-1]) | (start[1:] - end[:-1] > np.timedelta64(int(gap * 1e9), "ns"))
+    merged = bouts.groupby(np.cumsum(new), sort=False).agg(
+        species=("species", "first"),
+        start=("start", "min"),
+        end=("end", "max"),
+        count=("count", "sum"),
+        max_confidence=("max_confidence", "max"),
+    )
+    return merged.reset_index(drop=True)
+
+def segmentBouts(df, gap=BOUT_GAP):
+    # --- Bouts straight from detections (timestamp, species, confidence) ---
+    return mergeBouts(_asBouts(df), gap)
+
+class BoutTracker:
+    # Open bouts per species, closed as time-ordered detections arrive
+
+    def __init__(self, gap=BOUT_GAP, open=None, last=None):
+        self.gap = gap
+        self.open = _emptyBouts() if open is None else open
+        self.last = last
+
+    def add(self, df):
+        # Returns the bouts closed by these detections
+        if len(df) == 0:
+            return _emptyBouts()
+        latest = pd.to_datetime(df["timestamp"]).max()
+        self.last = latest if self.last is None else max(self.last, latest)
+        return self._split(mergeBouts(pd.concat([self.open, _asBouts(df)], ignore_index=True), self.gap))
+
+    def expire(self, now):
+        # Close the bouts no detection can extend any more
+        self.last = pd.Timestamp(now) if self.last is None else max(self.last, pd.Timestamp(now))
+        return self._split(self.open)
+
+    def _split(self, bouts):
+        if self.last is None:
+            return _emptyBouts()
+        newest = ~bouts["species"].duplicated(keep="last")
+        isOpen = newest & (bouts["end"] >= self.last - pd.Timedelta(seconds=self.gap))
+        self.open = bouts[isOpen].reset_index(drop=True)
+        return bouts[~isOpen].reset_index(drop=True)
+
+def readState(root=BOUT_DIR):
+    try:
+        with open(_statePath(root)) as f:
+            state = json.load(f)
+    except (FileNotFoundError, ValueError):
+        return None
+    state["open"] = pd.DataFrame(state["open"], columns=list(_emptyBouts().columns)).astype(_emptyBouts().dtypes.to_dict())
+    state["last"] = None if state["last"] is None else pd.Timestamp(state["last"])
+    return state
+
+def _writeState(state, root):
+    state = dict(state)
+    state["open"] = state["open"].assign(start=state["open"]["start"].astype(str), end=state["open"]["end"].astype(str)).to_dict("records")
+    state["last"] = None if state["last"] is None else str(state["last"])
+    tmp = _statePath(root) + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump(state, f)
+    os.replace(tmp, _statePath(root))
+
+def _months(root):
+    return sorted(os.path.basename(p)[:7] for p in glob.glob(os.path.join(root, "????-??.parquet")))
+
+def _readClosed(root, start=None, end=None):
+    # --- Closed bouts of the month partitions that can start in [start, end] ---
+    months = _months(root)
+    if start is not None:
+        months = [m for m in months if m >= pd.Timestamp(start).strftime("%Y-%m")]
+    if end is not None:
+        months = [m for m in months if m <= pd.Timestamp(end).strftime("%Y-%m")]
+    frames = [pd.read_parquet(_boutsPath(root, m)) for m in months]
+    return pd.concat([_emptyBouts()] + frames, ignore_index=True) if frames else _emptyBouts()
+
+def _writeMonth(bouts, root, month):
+    bouts = bouts.sort_values(["start", "species"], kind="stable").reset_index(drop=True)
+    bouts.to_parquet(_boutsPath(root, month) + ".tmp", index=False)
+    os.replace(_boutsPath(root, month) + ".tmp", _boutsPath(root, month))
+
+def _writeClosed(bouts, root):
+    # --- Replace all closed bouts ---
+    months = bouts["start"].dt.strftime("%Y-%m")
+    for month, part in bouts.groupby(months):
+        _writeMonth(part, root, month)
+    for month in set(_months(root)) - set(months):
+        os.remove(_boutsPath(root, month))
+
+def _appendClosed(closed, root):
+    # --- Add closed bouts; only the months they start in are rewritten ---
+    for month, part in closed.groupby(closed["start"].dt.strftime("%Y-%m")):
+        path = _boutsPath(root, month)
+        if os.path.exists(path):
+            part = pd.concat([pd.read_parquet(path), part], ignore_index=True)
+        _writeMonth(part, root, month)
+
+def addDetections(df, root=BOUT_DIR):
+    # Called by the writers with newly appended detections
+    state = readState(root)
+    if state is None or len(df) == 0:
+        return
+    df = df.assign(timestamp=pd.to_datetime(df["timestamp"]))
+    df = filterDetections(df, state)
+    tracker = BoutTracker(state["gap"], state["open"], state["last"])
+    _appendClosed(tracker.add(df), root)
+    state.update(open=tracker.open, last=tracker.last, rows=state["rows"] + len(df))
+    _writeState(state, root)
+
+def buildBouts(confidence_threshold, exclude, gap=BOUT_GAP, root=BOUT_DIR, storeRoot=STORE_DIR, thresholds=None):
+    # --- Full rebuild from the store, one day partition at a time ---
+    if os.path.exists(root):
+        shutil.rmtree(root)
+    os.makedirs(root)
+    state = {"gap": gap, "confidence_threshold": confidence_threshold, "exclude": sorted(exclude),
+             "thresholds": thresholds or {}, "rows": 0}
+    tracker = BoutTracker(gap)
+    closed = []
+    for day, _ in listPartitions(storeRoot):
+        end = pd.Timestamp(day) + pd.Timedelta("1D") - pd.Timedelta("1ns")
+        df = filterDetections(readDetections(start=day, end=end, root=storeRoot), state)
+        closed.append(tracker.add(df))
+        state["rows"] += len(df)
+    _writeClosed(pd.concat([_emptyBouts()] + closed, ignore_index=True), root)
+    state.update(open=tracker.open, last=tracker.last)
+    # state.json marks the table as complete
+    _writeState(state, root)
+
+def regap(gap, root=BOUT_DIR, storeRoot=STORE_DIR):
+    # --- Re-segment the table for a new gap threshold ---
+    state = readState(root)
+    bouts = pd.concat([_readClosed(root), state["open"]], ignore_index=True)
+    if gap < state["gap"]:
+        # Only bouts longer than the new gap can contain a larger gap; the
+        # detections of those are read back and segmented again
+        long = (bouts["end"] - bouts["start"]) > pd.Timedelta(seconds=gap)
+        affected = bouts[long]
+        if len(affected) > 0:
+            # Read back per day the affected bouts start in, from their
+            # first start to their last end
+            spans = affected.assign(species=affected["species"].astype(str)).sort_values("start")
+            frames = []
+            for _, day in spans.groupby(spans["start"].dt.floor("1D")):
+                raw = readDetections(start=day["start"].min(), end=day["end"].max(), root=storeRoot)
+                raw = filterDetections(raw, state)
+                raw = raw.assign(species=raw["species"].astype(str)).sort_values("timestamp")
+                inBout = pd.merge_asof(raw, day[["species", "start", "end"]], left_on="timestamp", right_on="start",
+                                       by="species", direction="backward")
+                frames.append(raw[(inBout["end"] >= inBout["timestamp"]).to_numpy()])
+            bouts = pd.concat([bouts[~long], segmentBouts(pd.concat(frames, ignore_index=True), gap)], ignore_index=True)
+    # A larger gap only joins neighbouring bouts
+    tracker = BoutTracker(gap, last=state["last"])
+    _writeClosed(tracker._split(mergeBouts(bouts, gap)), root)
+    state.update(gap=gap, open=tracker.open)
+    _writeState(state, root)
+
+def ensureBouts(confidence_threshold, exclude, gap=BOUT_GAP, rows=None, root=BOUT_DIR, storeRoot=STORE_DIR,
+                thresholds=None):
+    # --- Rebuild when missing, built with another filter or out of step
+    # with `rows` (the number of filtered detections in the store) ---
+    def stale(state):
+        return (state is None or state["confidence_threshold"] != confidence_threshold
+                or state["exclude"] != sorted(exclude) or state.get("thresholds", {}) != (thresholds or {})
+                or (rows is not None and state["rows"] != rows) or os.path.exists(_legacyPath(root)))
+
+    state = readState(root)
+    if not stale(state) and state["gap"] == gap:
+        return
+    # Checked again under the lock: another process may have rebuilt meanwhile
+    with writeLock(os.path.dirname(root)):
+        state = readState(root)
+        if stale(state):
+            buildBouts(confidence_threshold, exclude, gap, root, storeRoot, thresholds)
+        elif state["gap"] != gap:
+            regap(gap, root, storeRoot)
+
+def readBouts(start=None, end=None, root=BOUT_DIR):
+    # --- Closed and open bouts starting in [start, end] ---
+    state = readState(root)
+    bouts = pd.concat([_readClosed(root, start, end), state["open"]], ignore_index=True)
+    if start is not None:
+        bouts = bouts[bouts["start"] >= pd.Timestamp(start)]
+    if end is not None:
+        bouts = bouts[bouts["start"] <= pd.Timestamp(end)]
+    bouts = bouts.assign(duration=(bouts["end"] - bouts["start"]).dt.total_seconds())
+    return bouts.sort_values(["start", "species"], kind="stable").reset_index(drop=True)
@@ -0,0 +1,88 @@
+import sys
+import numpy as np
+import pandas as pd
+from diversity import shannon
+from speciesRegistry import filterByPolicy
+
+# Confidence as a histogram dimension next to species (and time): counts
+# per (bin, species, confidence bin) for detections that pass only the
+# exclude list. The count above any threshold on the grid is then a
+# cumulative sum over the confidence bins, so a sweep over thresholds is
+# one pass over the detections instead of one per threshold.
+#
+# Confidence bin i holds (edges[i-1], edges[i]], which makes "count above
+# edges[k]" (the `confidence > threshold` of the filters) exact. The
+# recorders drop detections below their own CONFIDENCE_THRESHOLD, so lower
+# thresholds cannot show more than that.
+CONFIDENCE_EDGES = np.round(np.linspace(0, 1, 21), 2)
+SWEEP_THRESHOLDS = [0.5, 0.6, 0.7, 0.8, 0.9]
+
+def confidenceBins(confidence, edges=CONFIDENCE_EDGES):
+    return np.searchsorted(edges, np.asarray(confidence, dtype=float), side="left").astype("int8")
+
+def edgeIndex(threshold, edges=CONFIDENCE_EDGES):
+    k = int(np.searchsorted(edges, threshold))
+    if k == len(edges) or not np.isclose(edges[k], threshold):
+        raise ValueError(f"Threshold {threshold} is not on the confidence grid {list(edges)}")
+    return k
+
+def excludeOnly(df, exclude):
+    # Detections of the species that are not excluded, at any confidence
+    return filterByPolicy(df, {"confidence_threshold": -np.inf, "exclude": exclude})
+
+def countSweep(df, resolution=None, edges=CONFIDENCE_EDGES):
+    # --- Long format counts per ([bin,] species, cbin); resolution e.g. "60min" ---
+    keys = [df["species"].astype(str).rename("species"),
+            pd.Series(confidenceBins(df["confidence"], edges), index=df.index, name="cbin")]
+    if resolution is not None:
+        keys.insert(0, df["timestamp"].dt.floor(resolution).rename("bin"))
+    if len(df) == 0:
+        return pd.DataFrame({k.name: pd.Series([], dtype=k.dtype) for k in keys}).assign(count=pd.Series([], dtype="int64"))
+    return df.groupby(keys).size().reset_index(name="count")
+
+def countsAbove(counts, threshold, edges=CONFIDENCE_EDGES):
+    # --- Counts of the detections with confidence > threshold, cbin summed out ---
+    above = counts[counts["cbin"] > edgeIndex(threshold, edges)]
+    keys = [c for c in counts.columns if c not in ("cbin", "count")]
+    return above.groupby(keys, sort=True)["count"].sum().reset_index()
+
+def sweepTable(counts, thresholds=SWEEP_THRESHOLDS, edges=CONFIDENCE_EDGES):
+    # --- Species x threshold counts from one reverse cumulative sum ---
+    hist = counts.pivot_table(index="species", columns="cbin", values="count", aggfunc="sum", fill_value=0)
+    hist = hist.reindex(columns=range(len(edges) + 1), fill_value=0)
+    above = hist.to_numpy()[:, ::-1].cumsum(axis=1)[:, ::-1]
+    columns = [edgeIndex(t, edges) + 1 for t in thresholds]
+    table = pd.DataFrame(above[:, columns], index=hist.index, columns=[f"{t:g}" for t in thresholds])
+    table = table[table.sum(axis=1) > 0]
+    return table.sort_values(list(table.columns), ascending=False).rename_axis("species").reset_index()
+
+def sweepSummary(table):
+    # --- Detections, species and Shannon diversity per threshold ---
+    matrix = table.set_index("species").T
+    return pd.DataFrame({
+        "threshold": matrix.index,
+        "detections": matrix.sum(axis=1).to_numpy(),
+        "species": (matrix > 0).sum(axis=1).to_numpy(),
+        "shannon": shannon(matrix).to_numpy().round(3),
+    })
+
+def printSweep(table, top=30):
+    summary = sweepSummary(table)
+    print("threshold  detections  species  shannon")
+    for _, row in summary.iterrows():
+        print(f"{row['threshold']:>9}  {row['detections']:>10}  {row['species']:>7}  {row['shannon']:>7.3f}")
+    print()
+    print(table.head(top).to_string(index=False))
+
+if __name__ == "__main__":
+    # Tuning: python confidenceSweep.py [THRESHOLD ...]
+    # One pass over the store, a day partition at a time
+    from detectionStore import listPartitions, readDetections
+    from birdFunctions import exclude
+    thresholds = [float(t) for t in sys.argv[1:]] or SWEEP_THRESHOLDS
+    frames = []
+    for day, _ in listPartitions():
+        end = pd.Timestamp(day) + pd.Timedelta("1D") - pd.Timedelta("1ns")
+        frames.append(countSweep(excludeOnly(readDetections(start=day, end=end), exclude)))
+    counts = pd.concat(frames or [countSweep(readDetections())], ignore_index=True)
+    printSweep(sweepTable(counts, thresholds))
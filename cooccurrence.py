@@ -0,0 +1,186 @@
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+# Species co-occurrence over time bins (15 minutes by default) for all
+# species, kept as sufficient statistics of the sparse bins x species count
+# matrix X:
+#   sums     column sums of X            sumsq    column sums of X**2
+#   cross    X.T @ X (sparse)            present  bins with the species
+#   copresent (X > 0).T @ (X > 0) (sparse)
+# Correlation and Jaccard similarity follow from these without the dense
+# matrix. Only bins with at least one detection are counted. The newest
+# bin may still grow, so it is held back until a later bin arrives.
+
+class CooccurrenceStats:
+    def __init__(self, freq="15min"):
+        self.freq = freq
+        self.species = []
+        self._codes = {}
+        self.n_bins = 0
+        self.sums = np.zeros(0)
+        self.sumsq = np.zeros(0)
+        self.present = np.zeros(0)
+        self.cross = sparse.csr_matrix((0, 0))
+        self.copresent = sparse.csr_matrix((0, 0))
+        self._pendingBin = None
+        self._pending = {}
+
+    def _code(self, name):
+        code = self._codes.get(name)
+        if code is None:
+            code = self._codes[name] = len(self.species)
+            self.species.append(name)
+        return code
+
+    def _resize(self):
+        n = len(self.species)
+        if n == len(self.sums):
+            return
+        grow = n - len(self.sums)
+        self.sums = np.concatenate([self.sums, np.zeros(grow)])
+        self.sumsq = np.concatenate([self.sumsq, np.zeros(grow)])
+        self.present = np.concatenate([self.present, np.zeros(grow)])
+        self.cross.resize((n, n))
+        self.copresent.resize((n, n))
+
+    def _commit(self, rows, cols, vals, n_bins):
+        # --- Add a bins x species block to the statistics ---
+        X = sparse.csr_matrix((vals, (rows, cols)), shape=(n_bins, len(self.species)))
+        P = (X > 0).astype(np.float64)
+        self.n_bins += n_bins
+        self.sums += np.asarray(X.sum(axis=0)).ravel()
+        self.sumsq += np.asarray(X.multiply(X).sum(axis=0)).ravel()
+        self.present += np.asarray(P.sum(axis=0)).ravel()
+        self.cross = (self.cross + X.T @ X).tocsr()
+        self.copresent = (self.copresent + P.T @ P).tocsr()
+
+    def add(self, data):
+        # --- Add detections (timestamp, species), in time order per call ---
+        if len(data) == 0:
+            return self
+        bins = pd.to_datetime(data["timestamp"]).dt.floor(self.freq)
+        counts = data.groupby([bins.rename("bin"), data["species"].astype(str).rename("species")]).size()
+        counts = counts[counts > 0]
+
+        # Merge the held back bin with the new counts
+        if self._pendingBin is not None:
+            pending = pd.Series(self._pending, dtype="int64")
+            pending.index = pd.MultiIndex.from_product([[self._pendingBin], pending.index], names=["bin", "species"])
+            counts = pending.add(counts, fill_value=0).astype("int64")
+
+        binValues = counts.index.get_level_values("bin")
+        last = binValues.max()
+        self._pendingBin = last
+        self._pending = counts[binValues == last].droplevel("bin").to_dict()
+        counts = counts[binValues != last]
+        if len(counts) == 0:
+            return self
+
+        binCodes, uniqueBins = pd.factorize(counts.index.get_level_values("bin"))
+        speciesCodes = np.array([self._code(s) for s in counts.index.get_level_values("species")])
+        self._resize()
+        self._commit(binCodes, speciesCodes, counts.values.astype(np.float64), len(uniqueBins))
+        return self
+
+    def _withPending(self):
+        # Statistics including the held back bin, without committing it
+        stats = CooccurrenceStats(self.freq)
+        stats.species, stats._codes = list(self.species), dict(self._codes)
+        stats.n_bins, stats.sums, stats.sumsq, stats.present = self.n_bins, self.sums.copy(), self.sumsq.copy(), self.present.copy()
+        stats.cross, stats.copresent = self.cross.copy(), self.copresent.copy()
+        if self._pendingBin is not None and len(self._pending) > 0:
+            codes = np.array([stats._code(s) for s in self._pending])
+            stats._resize()
+            stats._commit(np.zeros(len(codes), dtype=int), codes, np.array(list(self._pending.values()), dtype=np.float64), 1)
+        return stats
+
+    def correlation(self, species=None):
+        # --- Pearson correlation of bin counts, species x species ---
+        stats = self._withPending()
+        idx = np.arange(len(stats.species)) if species is None else np.array([stats._codes[s] for s in species])
+        n = stats.n_bins
+        s = stats.sums[idx]
+        cov = stats.cross[idx][:, idx].toarray() - np.outer(s, s) / n
+        var = stats.sumsq[idx] - s ** 2 / n
+        with np.errstate(invalid="ignore", divide="ignore"):
+            corr = cov / np.sqrt(np.outer(var, var))
+        names = [stats.species[i] for i in idx]
+        return pd.DataFrame(corr, index=names, columns=names)
+
+    def jaccard(self, species=None):
+        # --- Shared bins / bins with either species (sparse) ---
+        stats = self._withPending()
+        A = stats.copresent.tocoo()
+        union = stats.present[A.row] + stats.present[A.col] - A.data
+        J = sparse.csr_matrix((A.data / union, (A.row, A.col)), shape=A.shape)
+        if species is None:
+            return J, list(stats.species)
+        idx = np.array([stats._codes[s] for s in species])
+        return pd.DataFrame(J[idx][:, idx].toarray(), index=species, columns=species)
+
+    def topSpecies(self, k=15):
+        # Species of the held back bin are only known to the pending statistics
+        stats = self._withPending()
+        order = np.argsort(-stats.sums, kind="stable")[:k]
+        return [stats.species[i] for i in order]
+
+    def topPartners(self, species, k=5, metric="correlation"):
+        # --- The k species that co-occur most with `species` ---
+        stats = self._withPending()
+        i = stats._codes[species]
+        if metric == "jaccard":
+            row = stats.copresent.getrow(i).toarray().ravel()
+            with np.errstate(invalid="ignore", divide="ignore"):
+                scores = row / (stats.present[i] + stats.present - row)
+        else:
+            n = stats.n_bins
+            cov = stats.cross.getrow(i).toarray().ravel() - stats.sums[i] * stats.sums / n
+            var = stats.sumsq - stats.sums ** 2 / n
+            with np.errstate(invalid="ignore", divide="ignore"):
+                scores = cov / np.sqrt(var[i] * var)
+        scores[i] = np.nan
+        scores = pd.Series(scores, index=stats.species).dropna()
+        return scores.sort_values(ascending=False).head(k)
+
+    def save(self, path):
+        cross, copresent = self.cross.tocoo(), self.copresent.tocoo()
+        np.savez_compressed(
+            path, freq=self.freq, species=np.array(self.species, dtype=object), n_bins=self.n_bins,
+            sums=self.sums, sumsq=self.sumsq, present=self.present,
+            cross=np.vstack([cross.row, cross.col, cross.data]),
+            copresent=np.vstack([copresent.row, copresent.col, copresent.data]),
+            pendingBin=np.array([self._pendingBin], dtype="datetime64[ns]") if self._pendingBin is not None else np.array([], dtype="datetime64[ns]"),
+            pendingSpecies=np.array(list(self._pending), dtype=object),
+            pendingCounts=np.array(list(self._pending.values()), dtype=np.int64),
+        )
+
+    @classmethod
+    def load(cls, path):
+        f = np.load(path, allow_pickle=True)
+        stats = cls(str(f["freq"]))
+        stats.species = list(f["species"])
+        stats._codes = {s: i for i, s in enumerate(stats.species)}
+        stats.n_bins = int(f["n_bins"])
+        stats.sums, stats.sumsq, stats.present = f["sums"], f["sumsq"], f["present"]
+        n = len(stats.species)
+        for name in ("cross", "copresent"):
+            r, c, v = f[name]
+            setattr(stats, name, sparse.csr_matrix((v, (r.astype(int), c.astype(int))), shape=(n, n)))
+        if len(f["pendingBin"]) > 0:
+            stats._pendingBin = pd.Timestamp(f["pendingBin"][0])
+            stats._pending = dict(zip(f["pendingSpecies"], f["pendingCounts"].tolist()))
+        return stats
+
+if __name__ == "__main__":
+    # Self-check: species seen only in the held back bin, as in selections
+    # of one or a few bins
+    data = pd.DataFrame({
+        "timestamp": pd.to_datetime(["2026-05-01 05:00", "2026-05-01 05:20", "2026-05-01 05:20", "2026-05-01 05:21",
+                                     "2026-05-01 05:22"]),
+        "species": ["Merel", "Vink", "Vink", "Merel", "Vink"],
+    })
+    stats = CooccurrenceStats("15min").add(data)
+    assert stats.topSpecies(2) == ["Vink", "Merel"], stats.topSpecies(2)
+    assert CooccurrenceStats("15min").add(data.iloc[1:3]).topSpecies() == ["Vink"]
+    print("[COOCCURRENCE] ok")
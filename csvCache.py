@@ -0,0 +1,139 @@
+import glob
+import io
+import json
+import os
+import pandas as pd
+from detectionStore import concatFrames, toStoreFrame, fromStoreFrame, withStation
+
+# Incremental loader for the append-only detections CSV.
+# Next to the parsed frame (parquet segments) a checkpoint records how far
+# the CSV was read:
+#   {"inode": ..., "offset": ..., "last_timestamp": ..., "segments": ..., "base": ...}
+# Later calls only parse the bytes appended since the checkpoint. A new
+# inode (rotate_csv renamed the file), a file shorter than the offset
+# (truncation) or a mismatching last row trigger a full rebuild.
+CACHE_DIR = "data/.cache"
+COLUMNS = ["timestamp", "species", "confidence"]
+MAX_SEGMENTS = 16
+
+def _cachePaths(path, cacheDir):
+    name = os.path.basename(path)
+    return os.path.join(cacheDir, name + ".checkpoint.json"), os.path.join(cacheDir, name + ".parts")
+
+def _readCheckpoint(checkpointPath):
+    try:
+        with open(checkpointPath) as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return None
+
+def _writeCheckpoint(checkpoint, checkpointPath):
+    tmp = checkpointPath + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump(checkpoint, f)
+    os.replace(tmp, checkpointPath)
+
+def _parse(raw):
+    df = pd.read_csv(io.BytesIO(raw), names=COLUMNS, header=None, on_bad_lines="skip")
+    df["timestamp"] = pd.to_datetime(df["timestamp"], errors="coerce", format="ISO8601")
+    df["confidence"] = pd.to_numeric(df["confidence"], errors="coerce")
+    return df.dropna()
+
+def _readAppended(path, offset):
+    # --- Bytes from offset up to the last complete line ---
+    with open(path, "rb") as f:
+        f.seek(offset)
+        raw = f.read()
+    end = raw.rfind(b"\n") + 1
+    return raw[:end]
+
+def _lastLine(path, offset):
+    with open(path, "rb") as f:
+        f.seek(max(0, offset - 4096))
+        raw = f.read(offset - max(0, offset - 4096))
+    lines = raw.rstrip(b"\n").split(b"\n")
+    return lines[-1].decode("utf-8", errors="replace") if lines else ""
+
+def _checkpointValid(path, st, checkpoint, partsDir):
+    if checkpoint is None or not os.path.isdir(partsDir):
+        return False
+    if checkpoint["inode"] != st.st_ino or st.st_size < checkpoint["offset"]:
+        return False
+    if checkpoint["last_timestamp"] is None:
+        return True
+    return _lastLine(path, checkpoint["offset"]).startswith(checkpoint["last_timestamp"])
+
+def _segmentIndex(path):
+    return int(os.path.basename(path)[len("part-"):-len(".parquet")])
+
+def _segments(partsDir, base=0):
+    paths = sorted(glob.glob(os.path.join(partsDir, "part-*.parquet")))
+    return [p for p in paths if _segmentIndex(p) >= base]
+
+def _readSegments(partsDir, base=0):
+    # Segments cached before the station column read as DEFAULT_STATION
+    frames = [withStation(pd.read_parquet(p)) for p in _segments(partsDir, base)]
+    if len(frames) == 0:
+        return fromStoreFrame(toStoreFrame(pd.DataFrame(columns=COLUMNS)))
+    return fromStoreFrame(concatFrames(frames))
+
+def _writeSegment(df, partsDir, index):
+    path = os.path.join(partsDir, "part-%06d.parquet" % index)
+    toStoreFrame(df).to_parquet(path + ".tmp", index=False)
+    os.replace(path + ".tmp", path)
+
+def _rebuild(path, st, checkpointPath, partsDir):
+    os.makedirs(partsDir, exist_ok=True)
+    for p in _segments(partsDir):
+        os.remove(p)
+    with open(path, "rb") as f:
+        header = f.readline()
+    raw = _readAppended(path, len(header))
+    df = _parse(raw)
+    _writeSegment(df, partsDir, 0)
+    _writeCheckpoint({
+        "inode": st.st_ino,
+        "offset": len(header) + len(raw),
+        "last_timestamp": _lastTimestamp(raw),
+        "segments": 1,
+        "base": 0,
+    }, checkpointPath)
+    return _readSegments(partsDir)
+
+def _lastTimestamp(raw):
+    if len(raw) == 0:
+        return None
+    return raw.rstrip(b"\n").split(b"\n")[-1].split(b",")[0].decode("utf-8")
+
+def loadCSV(path="data/output.csv", cacheDir=CACHE_DIR):
+    if not os.path.exists(path):
+        return fromStoreFrame(toStoreFrame(pd.DataFrame(columns=COLUMNS)))
+
+    checkpointPath, partsDir = _cachePaths(path, cacheDir)
+    st = os.stat(path)
+    checkpoint = _readCheckpoint(checkpointPath)
+
+    if not _checkpointValid(path, st, checkpoint, partsDir):
+        return _rebuild(path, st, checkpointPath, partsDir)
+
+    # --- Only parse what was appended since the checkpoint ---
+    raw = _readAppended(path, checkpoint["offset"]) if st.st_size > checkpoint["offset"] else b""
+    if len(raw) > 0:
+        segments = checkpoint["segments"]
+        _writeSegment(_parse(raw), partsDir, segments)
+        checkpoint["offset"] += len(raw)
+        checkpoint["last_timestamp"] = _lastTimestamp(raw)
+        checkpoint["segments"] = segments + 1
+        _writeCheckpoint(checkpoint, checkpointPath)
+
+    df = _readSegments(partsDir, checkpoint["base"])
+    if checkpoint["segments"] - checkpoint["base"] > MAX_SEGMENTS:
+        # --- Compact the segments into one; older ones are ignored from then on ---
+        _writeSegment(df, partsDir, checkpoint["segments"])
+        checkpoint["base"] = checkpoint["segments"]
+        checkpoint["segments"] += 1
+        _writeCheckpoint(checkpoint, checkpointPath)
+        for p in _segments(partsDir):
+            if _segmentIndex(p) < checkpoint["base"]:
+                os.remove(p)
+    return df
@@ -0,0 +1,47 @@
+import numpy as np
+import pandas as pd
+
+# Dawn chorus queries on the daily first/last call index (one row per
+# date and species, see rollups.countCalls), so their cost scales with
+# days x species. Times are the naive local timestamps of the detections.
+
+def hourOfDay(ts):
+    return ts.dt.hour + ts.dt.minute / 60
+
+def medianFirstCall(calls, species=None):
+    # --- Median first call (hour of day) per species ---
+    if species is not None:
+        calls = calls[calls["species"].isin(species)]
+    first = hourOfDay(calls["first"]).rename("first_time")
+    return first.groupby(calls["species"]).median().reset_index()
+
+def seasonalTrend(calls, freq="M", column="first"):
+    # --- Median first (or last) call per period ("W", "M", "Q"), periods x species ---
+    times = hourOfDay(calls[column]).rename(column + "_time")
+    periods = calls["date"].dt.to_period(freq).dt.start_time.rename("period")
+    return times.groupby([periods, calls["species"]]).median().unstack("species")
+
+def sunrise(dates, latitude, longitude, timezone):
+    # --- Local sunrise per date (NOAA sunrise equation), NaT in polar day/night ---
+    dates = pd.DatetimeIndex(pd.to_datetime(dates)).floor("1D")
+    jd = dates.to_julian_date().to_numpy()
+    n = np.ceil(jd - 2451545.0 + 0.0008)
+    jstar = n - longitude / 360
+    m = np.radians((357.5291 + 0.98560028 * jstar) % 360)
+    c = 1.9148 * np.sin(m) + 0.02 * np.sin(2 * m) + 0.0003 * np.sin(3 * m)
+    lam = np.radians((np.degrees(m) + c + 180 + 102.9372) % 360)
+    transit = 2451545.0 + jstar + 0.0053 * np.sin(m) - 0.0069 * np.sin(2 * lam)
+    sinDecl = np.sin(lam) * np.sin(np.radians(23.4397))
+    cosDecl = np.cos(np.arcsin(sinDecl))
+    lat = np.radians(latitude)
+    cosHour = (np.sin(np.radians(-0.833)) - np.sin(lat) * sinDecl) / (np.cos(lat) * cosDecl)
+    with np.errstate(invalid="ignore"):
+        hourAngle = np.degrees(np.arccos(cosHour))
+    rise = pd.to_datetime(transit - hourAngle / 360, unit="D", origin="julian")
+    return pd.Series(rise.tz_localize("UTC").tz_convert(timezone).tz_localize(None), index=dates)
+
+def sunriseOffset(calls, latitude, longitude, timezone):
+    # --- Minutes between sunrise and the first call of each day ---
+    rise = sunrise(calls["date"].unique(), latitude, longitude, timezone)
+    offset = (calls["first"] - calls["date"].map(rise)).dt.total_seconds() / 60
+    return calls.assign(sunrise=calls["date"].map(rise), offset=offset)
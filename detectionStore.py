@@ -0,0 +1,159 @@
+import glob
+import os
+import pandas as pd
+from pandas.api.types import union_categoricals
+
+# Day-partitioned columnar store for detections: one parquet file per day
+# (data/store/YYYY-MM-DD.parquet) with a compact schema:
+#   timestamp  int64 (ns since epoch, local time like the CSV)
+#   species    dictionary encoded
+#   confidence float32
+#   station    dictionary encoded, the recorder the detection came from
+STORE_DIR = "data/store"
+# Station of detections written before there were several recorders
+DEFAULT_STATION = "local"
+CSV_FILES = ["data/output.csv"]
+ARCHIVE_PATTERN = "data/archive_*.csv"
+
+def partitionPath(day, root=STORE_DIR):
+    return os.path.join(root, "%s.parquet" % day)
+
+def listPartitions(root=STORE_DIR):
+    # --- Sorted list of (day, path) ---
+    paths = sorted(glob.glob(os.path.join(root, "????-??-??.parquet")))
+    return [(os.path.basename(p)[:-len(".parquet")], p) for p in paths]
+
+def hasStore(root=STORE_DIR):
+    return len(listPartitions(root)) > 0
+
+def toStoreFrame(df):
+    # --- Convert detections to the compact on-disk schema ---
+    return pd.DataFrame({
+        "timestamp": pd.to_datetime(df["timestamp"]).astype("datetime64[ns]").astype("int64"),
+        "species": df["species"].astype(str).astype("category"),
+        "confidence": df["confidence"].astype("float32"),
+        "station": (df["station"].astype(str) if "station" in df.columns
+                    else pd.Series(DEFAULT_STATION, index=df.index, dtype=object)).astype("category"),
+    })
+
+def fromStoreFrame(df):
+    df["timestamp"] = pd.to_datetime(df["timestamp"], unit="ns")
+    df["species"] = df["species"].astype("category")
+    df["station"] = df["station"].astype("category")
+    return df
+
+def concatFrames(frames):
+    # Concatenate store frames without decoding the species/station dictionaries
+    if len(frames) == 1:
+        return frames[0]
+    coded = {c: union_categoricals([f[c].astype("category") for f in frames]) for c in ("species", "station")}
+    df = pd.concat([f.drop(columns=list(coded)) for f in frames], ignore_index=True)
+    for c, values in coded.items():
+        df[c] = values
+    return df[["timestamp", "species", "confidence", "station"]]
+
+def withStation(df):
+    # Frames written before the station column
+    if "station" not in df.columns:
+        df["station"] = pd.Series(DEFAULT_STATION, index=df.index, dtype="category")
+    return df
+
+def _readPartition(path, columns=None):
+    df = pd.read_parquet(path, columns=None if columns is None else [c for c in columns if c != "station"] or None)
+    if columns is None or "station" in columns:
+        df = withStation(df)
+    return df
+
+def _writePartition(df, path):
+    # Write to a temp file and rename so readers never see a partial partition
+    tmp = path + ".tmp"
+    df.to_parquet(tmp, index=False)
+    os.replace(tmp, path)
+
+def lastTimestamp(root=STORE_DIR):
+    partitions = listPartitions(root)
+    if len(partitions) == 0:
+        return None
+    ts = _readPartition(partitions[-1][1], columns=["timestamp"])["timestamp"]
+    return pd.to_datetime(ts.max(), unit="ns")
+
+def readDetections(start=None, end=None, root=STORE_DIR, station=None):
+    # --- Only open the partitions overlapping [start, end] ---
+    # station: one station id or a list of them (default: all stations)
+    partitions = listPartitions(root)
+    if start is not None:
+        partitions = [(d, p) for d, p in partitions if d >= pd.Timestamp(start).strftime("%Y-%m-%d")]
+    if end is not None:
+        partitions = [(d, p) for d, p in partitions if d <= pd.Timestamp(end).strftime("%Y-%m-%d")]
+    if len(partitions) == 0:
+        return fromStoreFrame(toStoreFrame(pd.DataFrame(columns=["timestamp", "species", "confidence", "station"])))
+
+    frames = [_readPartition(p) for _, p in partitions]
+    df = concatFrames(frames)
+    # --- Filter the boundary partitions on the int64 column ---
+    if start is not None:
+        df = df[df["timestamp"] >= pd.Timestamp(start).value]
+    if end is not None:
+        df = df[df["timestamp"] <= pd.Timestamp(end).value]
+    if station is not None:
+        df = df[df["station"].isin([station] if isinstance(station, str) else station)]
+    return fromStoreFrame(df.reset_index(drop=True))
+
+def appendDetections(df, root=STORE_DIR, dedupe=False):
+    # --- Merge new detections into their day partitions ---
+    if len(df) == 0:
+        return
+    os.makedirs(root, exist_ok=True)
+    new = toStoreFrame(df)
+    days = pd.to_datetime(new["timestamp"], unit="ns").dt.strftime("%Y-%m-%d")
+    for day, part in new.groupby(days, sort=True):
+        path = partitionPath(day, root)
+        if os.path.exists(path):
+            part = pd.concat([_readPartition(path), part], ignore_index=True)
+        part["species"] = part["species"].astype(str).astype("category")
+        part["station"] = part["station"].astype(str).astype("category")
+        if dedupe:
+            part = part.drop_duplicates(subset=["timestamp", "species", "station"])
+        part = part.sort_values("timestamp", kind="stable").reset_index(drop=True)
+        _writePartition(part, path)
+
+def replaceDetections(df, start, end, root=STORE_DIR, station=DEFAULT_STATION):
+    # --- Replace the detections of one station in [start, end] by df ---
+    start, end = pd.Timestamp(start), pd.Timestamp(end)
+    os.makedirs(root, exist_ok=True)
+    new = toStoreFrame(df.assign(station=station))
+    newDays = pd.to_datetime(new["timestamp"], unit="ns").dt.strftime("%Y-%m-%d")
+    days = set(newDays) | set(pd.date_range(start.floor("1D"), end.floor("1D"), freq="1D").strftime("%Y-%m-%d"))
+    for day in sorted(days):
+        path = partitionPath(day, root)
+        part = new[(newDays == day).to_numpy()]
+        if os.path.exists(path):
+            old = _readPartition(path)
+            stale = ((old["timestamp"] >= start.value) & (old["timestamp"] <= end.value)
+                     & (old["station"].astype(str) == station))
+            part = pd.concat([old[~stale], part], ignore_index=True)
+        if len(part) == 0:
+            if os.path.exists(path):
+                os.remove(path)
+            continue
+        part["species"] = part["species"].astype(str).astype("category")
+        part["station"] = part["station"].astype(str).astype("category")
+        part = part.sort_values("timestamp", kind="stable").reset_index(drop=True)
+        _writePartition(part, path)
+
+def migrateCSV(paths=None, root=STORE_DIR, chunksize=200000):
+    # --- One-shot import of output.csv and rotated archives ---
+    if paths is None:
+        paths = sorted(glob.glob(ARCHIVE_PATTERN)) + CSV_FILES
+    total = 0
+    for path in paths:
+        if not os.path.exists(path):
+            continue
+        for chunk in pd.read_csv(path, chunksize=chunksize):
+            appendDetections(chunk, root=root, dedupe=True)
+            total += len(chunk)
+        print(f"[STORE] Imported {path}")
+    print(f"[STORE] {total} rows in {len(listPartitions(root))} partitions")
+
+if __name__ == "__main__":
+    migrateCSV()
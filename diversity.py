@@ -0,0 +1,69 @@
+import numpy as np
+import pandas as pd
+
+# Acoustic diversity from a bins x species count matrix. The matrix is
+# built once (from the rollup cubes or from raw detections at any bin
+# width) and Shannon, Simpson and richness are computed for all bins at
+# once with array operations.
+
+def countMatrix(counts):
+    # --- Long format (bin, species, count) -> bins x species matrix ---
+    return counts.pivot_table(index="bin", columns="species", values="count",
+                              aggfunc="sum", fill_value=0, observed=True)
+
+def detectionMatrix(data, freq="60min"):
+    # --- Matrix straight from detections, for any pandas bin width ---
+    bins = data["timestamp"].dt.floor(freq).rename("bin")
+    return data.groupby([bins, data["species"].astype(str).rename("species")]).size().unstack(fill_value=0)
+
+def hourOfDayMatrix(matrix):
+    return matrix.groupby(matrix.index.hour.rename("hour_of_day")).sum()
+
+def shannon(matrix, base=2):
+    m = np.asarray(matrix, dtype=float)
+    totals = m.sum(axis=1, keepdims=True)
+    p = np.divide(m, totals, out=np.zeros_like(m), where=totals > 0)
+    logp = np.log(p, out=np.zeros_like(p), where=p > 0) / np.log(base)
+    return pd.Series(0.0 - (p * logp).sum(axis=1), index=matrix.index, name="shannon")
+
+def simpson(matrix):
+    # Gini-Simpson index: probability that two detections are different species
+    m = np.asarray(matrix, dtype=float)
+    totals = m.sum(axis=1, keepdims=True)
+    p = np.divide(m, totals, out=np.zeros_like(m), where=totals > 0)
+    return pd.Series(1 - (p ** 2).sum(axis=1), index=matrix.index, name="simpson")
+
+def richness(matrix):
+    return pd.Series((np.asarray(matrix) > 0).sum(axis=1), index=matrix.index, name="richness")
+
+def diversityIndices(matrix):
+    return pd.concat([shannon(matrix), simpson(matrix), richness(matrix)], axis=1)
+
+def rollingIndices(matrix, window):
+    # --- Indices over a rolling window of bins (int) or time span ("3h") ---
+    return diversityIndices(matrix.rolling(window, min_periods=1).sum())
+
+def dailyCurves(matrix, index="shannon"):
+    # --- One column per day, one row per hour of day ---
+    hourly = matrix.groupby(matrix.index.floor("60min")).sum()
+    values = diversityIndices(hourly)[index]
+    return values.groupby([values.index.hour.rename("hour_of_day"), values.index.date]).first().unstack()
+
+class DiversityAccumulator:
+    # Keeps the count matrix and updates it with newly arrived detections
+    # (or long format counts), so indices never need a rebuild.
+
+    def __init__(self, freq="60min"):
+        self.freq = freq
+        self.matrix = pd.DataFrame(dtype="int64")
+
+    def add(self, data):
+        if "count" in data.columns:
+            update = countMatrix(data.assign(bin=data["bin"].dt.floor(self.freq)))
+        else:
+            update = detectionMatrix(data.assign(timestamp=pd.to_datetime(data["timestamp"])), self.freq)
+        self.matrix = self.matrix.add(update, fill_value=0).fillna(0).astype("int64")
+        return self
+
+    def indices(self):
+        return diversityIndices(self.matrix)
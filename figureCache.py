@@ -0,0 +1,86 @@
+import hashlib
+import io
+import json
+import math
+import os
+import pandas as pd
+from matplotlib import rcParams
+from matplotlib.font_manager import FontProperties
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
+
+# Rendered figures keyed by a hash of the plotted matrix, the plot
+# parameters and the drawing function's code, stored as PNG/SVG files.
+# A hit returns the stored file; the least recently used files are removed
+# when the cache grows beyond MAX_CACHE_BYTES.
+FIGURE_CACHE_DIR = "data/.cache/figures"
+MAX_CACHE_BYTES = 50 * 1024 * 1024
+DPI = 100
+
+def figureKey(draw, matrix, **params):
+    h = hashlib.sha256()
+    h.update(pd.util.hash_pandas_object(matrix, index=True).values.tobytes())
+    h.update(repr(list(matrix.columns)).encode())
+    h.update(json.dumps(params, sort_keys=True, default=str).encode())
+    h.update(draw.__qualname__.encode())
+    h.update(draw.__code__.co_code)
+    h.update(repr(draw.__code__.co_consts).encode())
+    return h.hexdigest()[:32]
+
+def newFigure(figsize):
+    # Plain Figure on an Agg canvas, without pyplot's figure manager
+    fig = Figure(figsize=figsize, dpi=DPI)
+    FigureCanvasAgg(fig)
+    return fig
+
+def fitMargins(fig, yLabels, xLabels, rotation=45):
+    # Margins estimated from the label lengths. tight_layout and
+    # bbox_inches="tight" measure every label, which draws the figure twice.
+    points = FontProperties(size=rcParams["ytick.labelsize"]).get_size_in_points()
+    charWidth = 0.6 * points / 72
+    width, height = fig.get_size_inches()
+    left = (max(map(len, yLabels), default=0) * charWidth + 0.3) / width
+    xLength = max(map(len, xLabels), default=0) * charWidth
+    bottom = (xLength * math.sin(math.radians(rotation)) + 2.5 * points / 72 + 0.3) / height
+    fig.subplots_adjust(left=min(left, 0.8), right=0.97, bottom=min(bottom, 0.5), top=1 - 0.4 / height)
+
+def evict(cacheDir=FIGURE_CACHE_DIR, maxBytes=MAX_CACHE_BYTES):
+    entries = []
+    for name in os.listdir(cacheDir):
+        st = os.stat(os.path.join(cacheDir, name))
+        entries.append((st.st_mtime, st.st_size, name))
+    total = sum(size for _, size, _ in entries)
+    for _, size, name in sorted(entries):
+        if total <= maxBytes:
+            break
+        os.remove(os.path.join(cacheDir, name))
+        total -= size
+
+def cachedFigure(draw, matrix, fmt="png", cacheDir=FIGURE_CACHE_DIR, maxBytes=MAX_CACHE_BYTES, **params):
+    # --- Rendered bytes of draw(matrix, **params), from the cache when possible ---
+    path = os.path.join(cacheDir, "%s.%s" % (figureKey(draw, matrix, **params), fmt))
+    if os.path.exists(path):
+        os.utime(path)
+        with open(path, "rb") as f:
+            return f.read()
+
+    fig = draw(matrix, **params)
+    buf = io.BytesIO()
+    fig.savefig(buf, format=fmt)
+    os.makedirs(cacheDir, exist_ok=True)
+    with open(path + ".tmp", "wb") as f:
+        f.write(buf.getvalue())
+    os.replace(path + ".tmp", path)
+    evict(cacheDir, maxBytes)
+    return buf.getvalue()
+
+def showFigure(data, fmt="png"):
+    # Display in the notebook (Quarto/Jupyter); returns the bytes elsewhere
+    try:
+        from IPython import get_ipython
+        from IPython.display import SVG, Image, display
+    except ImportError:
+        return data
+    if get_ipython() is None:
+        return data
+    display(SVG(data) if fmt == "svg" else Image(data=data, format="png"))
@@ -0,0 +1,155 @@
+import json
+import os
+import time
+import pandas as pd
+from datetime import datetime, timedelta
+from birdFunctions import (loadDetections, applyFilters, attachRollups, aggregateData,
+                           heatmapFrame, dailyCycleFrame, diversityFrame, overlapFrame, boutFrame,
+                           firstCallFrame, exclude)
+from confidenceSweep import countSweep, excludeOnly, sweepTable
+
+# Build step for the Quarto site (run as pre-render in _quarto.yml).
+# The detections are loaded and filtered once for the longest time frame;
+# every page's views are computed from slices of that selection and written
+# to data/report, where the pages load them with loadView().
+REPORT_DIR = "data/report"
+CONFIDENCE_THRESHOLD = 0.7
+
+# View name -> (function of the page selection, artifact kind)
+VIEWS = {
+    "latest": (lambda d: d.tail(50).iloc[::-1], "frame"),
+    "aggregate": (aggregateData, "frame"),
+    "heatmap_5min": (lambda d: heatmapFrame(d, timeFrame="5min"), "time_matrix"),
+    "heatmap_hour": (lambda d: heatmapFrame(d, timeFrame="hour"), "time_matrix"),
+    "heatmap_day": (lambda d: heatmapFrame(d, timeFrame="day"), "time_matrix"),
+    "heatmap_week": (lambda d: heatmapFrame(d, timeFrame="week"), "time_matrix"),
+    "daily_cycle": (dailyCycleFrame, "hour_matrix"),
+    "diversity": (diversityFrame, "frame"),
+    "overlap": (overlapFrame, "matrix"),
+    # From the bout table (data/bouts) when the selection matches the rollups
+    "bout_lengths": (lambda d: boutFrame(d)[["species", "duration"]], "frame"),
+    # From the first/last call index of the rollups
+    "first_calls": (firstCallFrame, "frame"),
+}
+
+# Views of the page's slice of the hourly confidence histogram, which is
+# counted once from the unthresholded detections
+SWEEP_VIEWS = {
+    "sweep": (sweepTable, "frame"),
+}
+
+PAGES = {
+    "index": {"minLim": 600, "views": ["latest"]},
+    "last_hour": {"minLim": 60, "views": ["aggregate", "heatmap_5min"]},
+    "day_summary": {"minLim": 60*24, "views": ["aggregate", "heatmap_hour"]},
+    "week_summary": {"minLim": 60*24*7, "views": ["aggregate", "heatmap_day"]},
+    "stats": {"minLim": 60*24*7*60, "views": ["aggregate", "daily_cycle", "heatmap_week", "diversity", "overlap",
+                                               "sweep", "bout_lengths", "first_calls"]},
+}
+
+def _saveView(frame, path, kind):
+    frame = frame.copy()
+    frame.attrs = {}
+    if kind == "frame":
+        frame.reset_index(drop=True).to_parquet(path, index=False)
+    else:
+        # Parquet needs string column names
+        frame.columns = [str(c) for c in frame.columns]
+        frame.index = frame.index.astype(str)
+        frame.to_parquet(path)
+
+def _loadView(path, kind):
+    frame = pd.read_parquet(path)
+    if kind == "time_matrix":
+        frame.columns = pd.to_datetime(frame.columns)
+    elif kind == "hour_matrix":
+        frame.columns = frame.columns.astype(int)
+    return frame
+
+def writeSummaryCSVs(df, outDir="data"):
+    # --- The unfiltered summaries (last hour, today, last week, hourly counts) ---
+    now = datetime.utcnow()
+    df[df['timestamp'] > now - timedelta(hours=1)].to_csv(os.path.join(outDir, "last_hour.csv"), index=False)
+    df[df['timestamp'].dt.date == now.date()].to_csv(os.path.join(outDir, "day.csv"), index=False)
+    df[df['timestamp'] > now - timedelta(days=7)].to_csv(os.path.join(outDir, "week.csv"), index=False)
+    last_day_df = df[df['timestamp'] > now - timedelta(days=1)]
+    stats = last_day_df.groupby(last_day_df['timestamp'].dt.hour).size()
+    stats.to_csv(os.path.join(outDir, "stats.csv"))
+
+def buildReport(outDir=REPORT_DIR, summaryDir=None):
+    # summaryDir: also write the summary CSVs there (parse_data.py); the
+    # pre-render leaves the committed ones alone
+    os.makedirs(outDir, exist_ok=True)
+    timings = {}
+
+    # --- Load and filter once, for the longest time frame ---
+    t = time.perf_counter()
+    maxLim = max(spec["minLim"] for spec in PAGES.values())
+    # Unfiltered: the sweep needs every confidence, the summaries every species
+    raw, timeFrame = loadDetections(maxLim)
+    endTime = timeFrame + timedelta(minutes=maxLim)
+    timings["load"] = time.perf_counter() - t
+
+    t = time.perf_counter()
+    filtered = applyFilters(raw, CONFIDENCE_THRESHOLD)
+    timings["filter"] = time.perf_counter() - t
+
+    t = time.perf_counter()
+    excluded = excludeOnly(raw, exclude)
+    sweep = countSweep(excluded, "60min")
+    timings["sweep"] = time.perf_counter() - t
+
+    if summaryDir is not None:
+        t = time.perf_counter()
+        writeSummaryCSVs(raw, summaryDir)
+        timings["summary_csvs"] = time.perf_counter() - t
+
+    manifest = {"built": datetime.now().isoformat(), "endTime": str(endTime), "pages": {}}
+    for page, spec in PAGES.items():
+        start = endTime - timedelta(minutes=spec["minLim"])
+        selection = filtered[filtered["timestamp"] >= start]
+        attachRollups(selection, start, CONFIDENCE_THRESHOLD)
+
+        views = {}
+        for name in spec["views"]:
+            if name in SWEEP_VIEWS:
+                fn, kind = SWEEP_VIEWS[name]
+                # Whole hours from the histogram, a partial first hour from the detections
+                first = pd.Timestamp(start).ceil("60min")
+                partial = excluded[(excluded["timestamp"] >= start) & (excluded["timestamp"] < first)]
+                source = pd.concat([countSweep(partial, "60min"), sweep[sweep["bin"] >= first]], ignore_index=True)
+            else:
+                fn, kind = VIEWS[name]
+                source = selection
+            # Heatmaps need at least one detection
+            if kind != "frame" and len(selection) == 0:
+                continue
+            t = time.perf_counter()
+            path = os.path.join(outDir, f"{page}_{name}.parquet")
+            _saveView(fn(source), path, kind)
+            timings[f"{page}/{name}"] = time.perf_counter() - t
+            views[name] = {"file": os.path.basename(path), "kind": kind}
+        manifest["pages"][page] = {"start": str(start), "rows": len(selection), "views": views}
+
+    manifest["timings"] = timings
+    with open(os.path.join(outDir, "manifest.json"), "w") as f:
+        json.dump(manifest, f, indent=1)
+
+    for name, seconds in timings.items():
+        print(f"[REPORT] {name:<28} {seconds * 1000:8.1f} ms")
+    return manifest
+
+def loadView(page, reportDir=REPORT_DIR):
+    # --- All views of one page; builds the report when it is missing ---
+    path = os.path.join(reportDir, "manifest.json")
+    if not os.path.exists(path):
+        buildReport(reportDir)
+    with open(path) as f:
+        manifest = json.load(f)
+    views = {name: None for name in PAGES[page]["views"]}
+    for name, info in manifest["pages"][page]["views"].items():
+        views[name] = _loadView(os.path.join(reportDir, info["file"]), info["kind"])
+    return views
+
+if __name__ == "__main__":
+    buildReport()
@@ -0,0 +1,250 @@
+import glob
+import hashlib
+import json
+import os
+import shutil
+import pandas as pd
+from detectionStore import STORE_DIR, listPartitions, readDetections
+from speciesRegistry import filterByPolicy
+from writeLock import writeLock
+
+# Precomputed species x time count cubes at 5 minute, hourly and daily
+# resolution, kept in long format (bin, species, count) so their size
+# scales with the occupied species/bin cells and not with detections.
+# Every filter (confidence threshold, exclude list, per-species thresholds)
+# gets its own directory, data/rollups/<filter key>/:
+#   5min/YYYY-MM-DD.parquet
+#   hour/YYYY-MM.parquet
+#   day/YYYY-MM.parquet
+#   calls/YYYY-MM.parquet    first/last detection per (date, species)
+#   meta.json                the filter the cubes were built with
+# The cubes only contain detections that pass that filter.
+# New detections only rewrite the partitions they fall in. The writers
+# update every filter directory; the least recently used ones beyond
+# MAX_FILTERS are removed.
+ROLLUP_DIR = "data/rollups"
+RESOLUTIONS = {"5min": "5min", "hour": "60min", "day": "1440min"}
+# Partition (file name format) and time column of every cube
+PARTITIONS = {
+    "5min": ("%Y-%m-%d", "bin"),
+    "hour": ("%Y-%m", "bin"),
+    "day": ("%Y-%m", "bin"),
+    "calls": ("%Y-%m", "date"),
+}
+MAX_FILTERS = 4
+
+_cubeCache = {}
+
+def _metaPath(root):
+    return os.path.join(root, "meta.json")
+
+def _partitionPath(kind, root, key):
+    return os.path.join(root, kind, "%s.parquet" % key)
+
+def _emptyCube():
+    return pd.DataFrame({
+        "bin": pd.Series([], dtype="datetime64[ns]"),
+        "species": pd.Series([], dtype="category"),
+        "count": pd.Series([], dtype="int64"),
+    })
+
+def _emptyCalls():
+    return pd.DataFrame({
+        "date": pd.Series([], dtype="datetime64[ns]"),
+        "species": pd.Series([], dtype="category"),
+        "first": pd.Series([], dtype="datetime64[ns]"),
+        "last": pd.Series([], dtype="datetime64[ns]"),
+        "count": pd.Series([], dtype="int64"),
+    })
+
+EMPTY = {"5min": _emptyCube, "hour": _emptyCube, "day": _emptyCube, "calls": _emptyCalls}
+
+def makeMeta(confidence_threshold, exclude, thresholds=None):
+    return {"confidence_threshold": confidence_threshold, "exclude": sorted(exclude), "thresholds": thresholds or {}}
+
+def rollupDir(confidence_threshold, exclude, thresholds=None, root=ROLLUP_DIR):
+    # --- Directory of the cubes for one filter ---
+    meta = makeMeta(confidence_threshold, exclude, thresholds)
+    key = hashlib.sha1(json.dumps(meta, sort_keys=True).encode()).hexdigest()[:12]
+    return os.path.join(root, key)
+
+def readMeta(root):
+    try:
+        with open(_metaPath(root)) as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return None
+
+def _writeMeta(meta, root):
+    tmp = _metaPath(root) + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump(meta, f)
+    os.replace(tmp, _metaPath(root))
+
+def listRollups(root=ROLLUP_DIR):
+    # --- Complete filter directories, most recently used first ---
+    dirs = [d for d in glob.glob(os.path.join(root, "*", "")) if os.path.exists(_metaPath(d))]
+    dirs = [d.rstrip(os.sep) for d in dirs]
+    return sorted(dirs, key=lambda d: os.path.getmtime(_metaPath(d)), reverse=True)
+
+def latestRollup(root=ROLLUP_DIR):
+    dirs = listRollups(root)
+    return dirs[0] if dirs else None
+
+def filterDetections(df, meta):
+    return filterByPolicy(df, meta)
+
+def countDetections(df, resolution):
+    # --- Long format counts of detections per (bin, species) ---
+    if len(df) == 0:
+        return _emptyCube()
+    bins = df["timestamp"].dt.floor(RESOLUTIONS[resolution]).rename("bin")
+    counts = df.groupby([bins, df["species"].astype(str).rename("species")]).size()
+    return counts.reset_index(name="count")
+
+def countCalls(df):
+    # --- First and last detection and count per (date, species) ---
+    if len(df) == 0:
+        return _emptyCalls()
+    dates = df["timestamp"].dt.floor("1D").rename("date")
+    calls = df.groupby([dates, df["species"].astype(str).rename("species")])["timestamp"].agg(
+        first="min", last="max", count="size")
+    return calls.reset_index()
+
+def _mergeCube(path, counts, keys=("bin", "species")):
+    if os.path.exists(path):
+        counts = pd.concat([pd.read_parquet(path), counts], ignore_index=True)
+    counts = counts.assign(species=counts["species"].astype(str))
+    cube = counts.groupby(list(keys), sort=True)["count"].sum().reset_index()
+    cube["species"] = cube["species"].astype("category")
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    cube.to_parquet(path + ".tmp", index=False)
+    os.replace(path + ".tmp", path)
+
+def _mergeCalls(path, calls):
+    if os.path.exists(path):
+        calls = pd.concat([pd.read_parquet(path), calls], ignore_index=True)
+    calls = calls.assign(species=calls["species"].astype(str))
+    calls = calls.groupby(["date", "species"], sort=True).agg(
+        first=("first", "min"), last=("last", "max"), count=("count", "sum")).reset_index()
+    calls["species"] = calls["species"].astype("category")
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    calls.to_parquet(path + ".tmp", index=False)
+    os.replace(path + ".tmp", path)
+
+def _mergePartitions(kind, root, counts):
+    # --- Merge counts into the partitions they fall in; the others are not touched ---
+    fmt, column = PARTITIONS[kind]
+    for key, part in counts.groupby(counts[column].dt.strftime(fmt)):
+        if kind == "calls":
+            _mergeCalls(_partitionPath(kind, root, key), part)
+        else:
+            _mergeCube(_partitionPath(kind, root, key), part)
+
+def _addDetections(df, meta, root):
+    # --- Filtered detections into all cubes ---
+    df = filterDetections(df, meta)
+    if len(df) == 0:
+        return
+    for resolution in RESOLUTIONS:
+        _mergePartitions(resolution, root, countDetections(df, resolution))
+    _mergePartitions("calls", root, countCalls(df))
+
+def addDetections(df, root=ROLLUP_DIR):
+    # Called by the writers with newly appended detections
+    if len(df) == 0:
+        return
+    df = df.assign(timestamp=pd.to_datetime(df["timestamp"]))
+    for path in listRollups(root):
+        _addDetections(df, readMeta(path), path)
+
+def buildRollups(confidence_threshold, exclude, root=ROLLUP_DIR, storeRoot=STORE_DIR, thresholds=None):
+    # --- Full rebuild of one filter from the store, a day partition at a time; returns its directory ---
+    path = rollupDir(confidence_threshold, exclude, thresholds, root)
+    if os.path.exists(path):
+        shutil.rmtree(path)
+    os.makedirs(path)
+    meta = makeMeta(confidence_threshold, exclude, thresholds)
+    for day, _ in listPartitions(storeRoot):
+        end = pd.Timestamp(day) + pd.Timedelta("1D") - pd.Timedelta("1ns")
+        _addDetections(readDetections(start=day, end=end, root=storeRoot), meta, path)
+    # meta.json marks the cubes as complete
+    _writeMeta(meta, path)
+    return path
+
+def _evict(root, keep):
+    # Least recently used filters beyond MAX_FILTERS, directories of an
+    # older filter key and the cubes of before the filter directories
+    for path in listRollups(root):
+        meta = readMeta(path)
+        if rollupDir(meta["confidence_threshold"], meta["exclude"], meta.get("thresholds"), root) != path:
+            shutil.rmtree(path, ignore_errors=True)
+    for path in listRollups(root)[MAX_FILTERS:]:
+        if path != keep:
+            shutil.rmtree(path, ignore_errors=True)
+    for name in ["meta.json", "hour.parquet", "day.parquet", "calls.parquet", "sweep.parquet"]:
+        if os.path.exists(os.path.join(root, name)):
+            os.remove(os.path.join(root, name))
+    if os.path.isdir(os.path.join(root, "5min")):
+        shutil.rmtree(os.path.join(root, "5min"))
+
+def ensureRollups(confidence_threshold, exclude, root=ROLLUP_DIR, storeRoot=STORE_DIR, thresholds=None):
+    # --- Directory of the cubes for this filter, built when missing ---
+    path = rollupDir(confidence_threshold, exclude, thresholds, root)
+    if readMeta(path) is None:
+        with writeLock(os.path.dirname(root)):
+            if readMeta(path) is None:
+                buildRollups(confidence_threshold, exclude, root, storeRoot, thresholds)
+                _evict(root, path)
+    else:
+        # Marks the filter as used
+        os.utime(_metaPath(path))
+    return path
+
+def _readCached(path):
+    mtime = os.path.getmtime(path)
+    cached = _cubeCache.get(path)
+    if cached is None or cached[0] != mtime:
+        cached = (mtime, pd.read_parquet(path))
+        _cubeCache[path] = cached
+    return cached[1]
+
+def _readPartitions(kind, root, start=None, end=None):
+    # --- Rows of the partitions overlapping [start, end], time column in range ---
+    fmt, column = PARTITIONS[kind]
+    if root is None:
+        root = latestRollup()
+    paths = sorted(glob.glob(os.path.join(root, kind, "*.parquet"))) if root is not None else []
+    if start is not None:
+        first = pd.Timestamp(start).strftime(fmt)
+        paths = [p for p in paths if os.path.basename(p)[:-len(".parquet")] >= first]
+    if end is not None:
+        last = pd.Timestamp(end).strftime(fmt)
+        paths = [p for p in paths if os.path.basename(p)[:-len(".parquet")] <= last]
+    frames = [_readCached(p) for p in paths]
+    if len(frames) == 0:
+        return EMPTY[kind]()
+    rows = pd.concat(frames, ignore_index=True) if len(frames) > 1 else frames[0]
+    if start is not None:
+        start = pd.Timestamp(start)
+        rows = rows[rows[column] >= (start.floor("1D") if kind == "calls" else start)]
+    if end is not None:
+        rows = rows[rows[column] <= pd.Timestamp(end)]
+    return rows.assign(species=rows["species"].astype(str)).reset_index(drop=True)
+
+def readCube(resolution, start=None, end=None, root=None):
+    # --- (bin, species, count) for bins in [start, end]; root None: latest filter ---
+    return _readPartitions(resolution, root, start, end)
+
+def readCalls(start=None, end=None, root=None):
+    # --- Daily first/last calls for dates in [start, end] ---
+    return _readPartitions("calls", root, start, end)
+
+def isAligned(ts, resolution):
+    ts = pd.Timestamp(ts)
+    return ts == ts.floor(RESOLUTIONS[resolution])
+
+def rebin(cube, resolution):
+    # --- Sum a finer cube into coarser bins ---
+    bins = cube["bin"].dt.floor(RESOLUTIONS[resolution])
+    return cube.groupby([bins, cube["species"]])["count"].sum().reset_index()
@@ -0,0 +1,64 @@
+import argparse
+import tempfile
+import time
+import tracemalloc
+import numpy as np
+from scipy.io.wavfile import write
+from birdnetlib import Recording
+from birdnetlib.analyzer import Analyzer
+from inference import analyze_buffer
+
+# Per-window latency and allocations of the old temp-file inference path
+# (write WAV -> Recording reads and resamples it) against the in-memory
+# path (resample once -> RecordingBuffer).
+#
+#   python bench_inference.py --model model.tflite --labels nl.txt
+
+SAMPLE_RATE = 44100
+WINDOW_SECS = 30
+
+def temp_file_path(analyzer, samples):
+    with tempfile.NamedTemporaryFile(suffix=".wav", delete=True) as temp_audio:
+        write(temp_audio.name, SAMPLE_RATE, samples)
+        rec = Recording(path=temp_audio.name, analyzer=analyzer)
+        rec.analyze()
+    return rec.detections
+
+def in_memory_path(analyzer, samples):
+    return analyze_buffer(analyzer, samples, SAMPLE_RATE)
+
+def measure(fn, analyzer, windows):
+    fn(analyzer, windows[0])  # warm up
+    times = []
+    tracemalloc.start()
+    for samples in windows:
+        t = time.perf_counter()
+        fn(analyzer, samples)
+        times.append(time.perf_counter() - t)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return np.median(times), np.max(times), peak
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--model", default=None)
+    parser.add_argument("--labels", default=None)
+    parser.add_argument("--windows", type=int, default=10)
+    args = parser.parse_args()
+
+    if args.model:
+        analyzer = Analyzer(classifier_model_path=args.model, classifier_labels_path=args.labels)
+    else:
+        analyzer = Analyzer()
+
+    rng = np.random.default_rng(0)
+    windows = [(0.1 * rng.standard_normal(SAMPLE_RATE * WINDOW_SECS)).astype(np.float32)
+               for _ in range(args.windows)]
+
+    print(f"{'path':<12} {'median s':>9} {'max s':>9} {'peak MB':>9}")
+    for name, fn in [("temp file", temp_file_path), ("in memory", in_memory_path)]:
+        median, worst, peak = measure(fn, analyzer, windows)
+        print(f"{name:<12} {median:>9.3f} {worst:>9.3f} {peak / 1024**2:>9.1f}")
+
+if __name__ == "__main__":
+    main()
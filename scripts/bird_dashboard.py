@@ -3,20 +3,35 @@ import numpy as np
 import datetime
 import threading
 import time
-from flask import Flask, render_template_string, send_file
+from flask import Flask, render_template_string, send_file, request, jsonify, Response
 import matplotlib
 import matplotlib.pyplot as plt
 matplotlib.use("Agg")
 import io
-from birdnetlib import Recording
 from birdnetlib.analyzer import Analyzer
-import tempfile
 import os
-import csv
 from collections import Counter
-from scipy.io.wavfile import write
-import shutil
 import subprocess
+import sys
+import atexit
+import json
+import urllib.request
+import pandas as pd
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from detectionStore import appendDetections
+from csvCache import loadCSV
+from rollups import addDetections
+from shardStore import appendShards
+import bouts
+from capture_pipeline import InferenceWorker
+from inference import analyze_buffer
+from ring_buffer import SlidingWindows, DetectionMerger
+from detection_writer import DetectionWriter
+from live_index import LiveIndex
+from metrics import Metrics
+from clip_store import ClipStore
+from writeLock import writeLock
 
 app = Flask(__name__)
 
@@ -24,38 +39,76 @@ app = Flask(__name__)
 # CONFIG
 # ======================================================
 SAMPLE_RATE = 44100
-WINDOW_SECS = 30
+WINDOW_SECS = 3
+HOP_SECS = 1
 CONFIDENCE_THRESHOLD = 0.5
 
+# Audio blocks (one hop each) waiting for inference; "drop_oldest" or "block" when full
+INFERENCE_QUEUE_SIZE = 30
+BACKPRESSURE = "drop_oldest"
+
 CSV_FILE = "../data/output.csv"
+STORE_DIR = "../data/store"
+CACHE_DIR = "../data/.cache"
+ROLLUP_DIR = "../data/rollups"
+BOUT_DIR = "../data/bouts"
+# Committed by the auto-committer: day shards + manifest (output.csv stays local)
+SHARD_DIR = "../data/shards"
 DETECTIONS_DIR = "detections"
 
+# This recorder's id; with INGEST_URL set (e.g. "http://birdhost:4100/ingest")
+# the batches go to the central ingest_server.py instead of the local store
+STATION_ID = "local"
+INGEST_URL = None
+INGEST_TIMEOUT_SECS = 10
+
+# Detection clips: only the call segment (plus padding), oldest evicted first
+SAVE_AUDIO = False
+CLIP_FORMAT = "flac"  # "flac" (needs soundfile) or "wav"
+CLIP_PADDING_SECS = 0.5
+KEEP_CONFIDENCE = 0.9
 MAX_AUDIO_FILES = 200
 MIN_FREE_SPACE_GB = 5
 MAX_CSV_SIZE_MB = 50
 
-# ======================================================
-# DISK SAFETY
-# ======================================================
+# Detections are written in batches: after this many rows or seconds
+WRITE_BATCH_ROWS = 50
+WRITE_BATCH_SECS = 30
+FSYNC_POLICY = "never"  # "never", "flush" or "close"
 
-def disk_ok():
-    total, used, free = shutil.disk_usage("/")
-    return free > MIN_FREE_SPACE_GB * 1024**3
+# Windows served by the dashboard from the in-memory index
+LIVE_WINDOWS = {"1h": 1, "24h": 24, "7d": 7 * 24}
+LIVE_INDEX_HOURS = 7 * 24
 
-def cleanup_old_audio():
-    if not os.path.exists(DETECTIONS_DIR):
-        return
+# Prometheus-style metrics on /metrics; when disabled the timers are no-ops
+METRICS_ENABLED = True
 
-    files = sorted(
-        [os.path.join(DETECTIONS_DIR, f) for f in os.listdir(DETECTIONS_DIR)],
-        key=os.path.getmtime
-    )
+# ======================================================
+# METRICS
+# ======================================================
 
-    for f in files[:-MAX_AUDIO_FILES]:
-        try:
-            os.remove(f)
-        except:
-            pass
+metrics = Metrics(enabled=METRICS_ENABLED)
+callback_seconds = metrics.histogram(
+    "audio_callback_seconds", "Time spent in the audio callback",
+    buckets=(0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.05)
+)
+audio_status = {
+    flag: metrics.counter("audio_status", "Status flags reported to the audio callback", {"flag": flag})
+    for flag in ("input_overflow", "input_underflow")
+}
+inference_seconds = metrics.histogram("inference_seconds", "BirdNET analysis time per window")
+window_detections = metrics.histogram(
+    "window_detections", "Detections above the threshold per window", buckets=(0, 1, 2, 3, 5, 10)
+)
+save_detection_seconds = metrics.histogram("save_detection_seconds", "Time spent in save_detection")
+save_audio_seconds = metrics.histogram("save_audio_seconds", "Time spent in save_detection_audio")
+git_seconds = {
+    command: metrics.histogram(
+        "git_seconds", "Duration of the auto-commit git commands", {"command": command},
+        buckets=(0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+    )
+    for command in ("status", "add", "commit", "push", "gc")
+}
 
 # ======================================================
 # CSV STORAGE + ROTATION
@@ -73,56 +126,90 @@ def rotate_csv():
         os.rename(CSV_FILE, archive)
         print(f"[CSV] Rotated → {archive}")
 
+csv_lock = threading.Lock()
+
 def read_csv():
-    rows = []
-    try:
-        with open(CSV_FILE, newline="", encoding="utf-8") as f:
-            reader = csv.DictReader(f)
-            for row in reader:
-                try:
-                    row["timestamp"] = datetime.datetime.fromisoformat(row["timestamp"])
-                    row["confidence"] = float(row["confidence"])
-                    rows.append(row)
-                except:
-                    continue
-    except FileNotFoundError:
-        pass
-    return rows
-
-def save_detection(species, confidence):
-    ts = datetime.datetime.now().isoformat()
-    write_header = not os.path.exists(CSV_FILE)
-
-    with open(CSV_FILE, "a", newline="", encoding="utf-8") as f:
-        writer = csv.DictWriter(f, fieldnames=["timestamp","species","confidence"])
-        if write_header:
-            writer.writeheader()
-        writer.writerow({
-            "timestamp": ts,
-            "species": species,
-            "confidence": confidence
-        })
+    # Incremental: only rows appended since the last request are parsed
+    with csv_lock:
+        return loadCSV(CSV_FILE, cacheDir=CACHE_DIR)
+
+def post_batch(rows):
+    rows = [dict(row, confidence=float(row["confidence"])) for row in rows]
+    body = json.dumps({"station": STATION_ID, "detections": rows}).encode("utf-8")
+    req = urllib.request.Request(INGEST_URL, data=body, headers={"Content-Type": "application/json"})
+    with urllib.request.urlopen(req, timeout=INGEST_TIMEOUT_SECS) as response:
+        return json.load(response)
+
+def store_batch(rows):
+    # Each flushed CSV batch also goes into the shards, columnar store, rollups and bouts
+    if INGEST_URL is not None:
+        try:
+            post_batch(rows)
+            return
+        except (OSError, ValueError) as e:
+            # Kept in the local store rather than lost
+            print(f"[INGEST ERROR] {e}")
+    batch = pd.DataFrame(rows).assign(station=STATION_ID)
+    # Shared with the ingest server and reanalyze: one writer at a time
+    with writeLock(os.path.dirname(STORE_DIR)):
+        appendShards(batch, root=SHARD_DIR)
+        appendDetections(batch, root=STORE_DIR)
+        addDetections(batch, root=ROLLUP_DIR)
+        bouts.addDetections(batch, root=BOUT_DIR)
+
+writer = DetectionWriter(
+    CSV_FILE,
+    on_flush=store_batch,
+    max_rows=WRITE_BATCH_ROWS,
+    max_age=WRITE_BATCH_SECS,
+    fsync=FSYNC_POLICY
+).start()
+atexit.register(writer.close)
+metrics.counter("csv_written_bytes", "Bytes appended to the CSV", fn=lambda: writer.counts["bytes"])
+metrics.counter("csv_written_rows", "Rows appended to the CSV", fn=lambda: writer.counts["rows"])
+metrics.counter("csv_flushes", "Batched CSV writes", fn=lambda: writer.counts["flushes"])
+
+def local_seconds(dt):
+    # Detection timestamps are naive local time; keep them that way in the index
+    return (dt - datetime.datetime(1970, 1, 1)).total_seconds()
+
+# Recent detections for the dashboard, seeded from the CSV once at startup
+live_index = LiveIndex(retention=LIVE_INDEX_HOURS * 3600)
+recent = read_csv()
+recent = recent[recent["timestamp"] > datetime.datetime.now() - datetime.timedelta(hours=LIVE_INDEX_HOURS)]
+live_index.load((recent["timestamp"] - pd.Timestamp(1970, 1, 1)).dt.total_seconds().tolist(), recent["species"].astype(str).tolist())
+del recent
+
+def save_detection(species, confidence, ts=None):
+    ts = ts or datetime.datetime.now()
+    writer.add(ts.isoformat(), species, confidence)
+    live_index.add(local_seconds(ts), species)
 
 # ======================================================
 # OPTIONAL AUDIO SAVE (SAFE)
 # ======================================================
 
-def save_detection_audio(indata, species, confidence):
-    if not disk_ok():
-        print("[WARNING] Low disk space — skipping audio")
-        return
-
-    os.makedirs(DETECTIONS_DIR, exist_ok=True)
-
-    timestamp = datetime.datetime.now().strftime("%Y%m%d-%H%M%S")
-    safe_species = species.replace(" ", "_")
-
-    filename = f"{DETECTIONS_DIR}/{timestamp}_{safe_species}_{confidence:.2f}.wav"
-
-    write(filename, SAMPLE_RATE, indata[:, 0])
-    cleanup_old_audio()
-
-    print(f"[AUDIO SAVED] {filename}")
+def clip_priority(species, confidence):
+    # Confident clips outlive the others when the store is full
+    return 1 if confidence >= KEEP_CONFIDENCE else 0
+
+clips = ClipStore(
+    DETECTIONS_DIR,
+    max_files=MAX_AUDIO_FILES,
+    min_free_gb=MIN_FREE_SPACE_GB,
+    fmt=CLIP_FORMAT,
+    priority=clip_priority
+).start() if SAVE_AUDIO else None
+if clips is not None:
+    atexit.register(clips.close)
+metrics.counter("clips_saved", "Detection clips written", fn=lambda: clips.counts["saved"] if clips else 0)
+metrics.counter("clips_evicted", "Detection clips removed by retention", fn=lambda: clips.counts["evicted"] if clips else 0)
+
+def save_detection_audio(samples, species, confidence, ts, segment=None):
+    # Queued for the background writer; only the call segment is kept
+    name = clips.save(samples, SAMPLE_RATE, species, confidence, ts, segment=segment, padding=CLIP_PADDING_SECS)
+    if name is None:
+        print("[WARNING] Low disk space or writer busy — skipping audio")
 
 # ======================================================
 # BIRDNET
@@ -137,33 +224,75 @@ analyzer = Analyzer(
 )
 
 # ======================================================
-# AUDIO CALLBACK
+# INFERENCE (WORKER THREAD)
 # ======================================================
 
-def audio_callback(indata, frames, time_info, status):
-    with tempfile.NamedTemporaryFile(suffix=".wav", delete=True) as temp_audio:
-        write(temp_audio.name, SAMPLE_RATE, indata[:, 0])
-
-        rec = Recording(path=temp_audio.name, analyzer=analyzer)
-        rec.analyze()
-
-    if rec.detections:
-        for r in rec.detections:
-            species = r["common_name"]
-            conf = r["confidence"]
-
-            if species.lower() == "human vocal":
-                continue
-
-            if conf >= CONFIDENCE_THRESHOLD:
-                print(f"{species}: {conf:.2f}")
+windows = SlidingWindows(SAMPLE_RATE * WINDOW_SECS, SAMPLE_RATE * HOP_SECS)
+merger = DetectionMerger()
+pending_clips = {}
+
+def analyze_window(samples, window_start):
+    # In memory: resampled once and passed to the analyzer as a buffer
+    with inference_seconds.time():
+        detections = analyze_buffer(analyzer, samples, SAMPLE_RATE)
+
+    hits = [
+        r for r in detections
+        if r["common_name"].lower() != "human vocal" and r["confidence"] >= CONFIDENCE_THRESHOLD
+    ]
+    window_detections.observe(len(hits))
+
+    # Overlapping windows see the same call; report each call once
+    for call in merger.add(window_start, hits):
+        species = call["species"]
+        conf = call["confidence"]
+        print(f"{species}: {conf:.2f}")
+
+        ts = datetime.datetime.fromtimestamp(call["start"])
+        with save_detection_seconds.time():
+            save_detection(species, conf, ts)
+
+        clip = pending_clips.pop(species, None)
+        if clip is not None:
+            with save_audio_seconds.time():
+                save_detection_audio(clip[1], species, conf, ts, segment=clip[2])
+
+    # Keep the audio of the most confident hit of each open call
+    if SAVE_AUDIO:
+        for r in hits:
+            best = pending_clips.get(r["common_name"])
+            if best is None or r["confidence"] > best[0]:
+                pending_clips[r["common_name"]] = (r["confidence"], samples.copy(), (r["start_time"], r["end_time"]))
+
+def process_block(block, captured):
+    # Slide the analysis window over the captured audio (views, no copies)
+    for window, after in windows.push(block):
+        window_start = captured - (after + len(window)) / SAMPLE_RATE
+        analyze_window(window, window_start)
+
+inference = InferenceWorker(
+    process_block,
+    maxsize=INFERENCE_QUEUE_SIZE,
+    policy=BACKPRESSURE,
+    late_after=WINDOW_SECS
+).start()
+metrics.gauge("inference_queue_depth", "Audio blocks waiting for inference", fn=inference.queue.qsize)
+for key in ("enqueued", "dropped", "late", "processed", "errors"):
+    metrics.counter(f"inference_blocks_{key}", f"Audio blocks {key} by the inference worker",
+                    fn=lambda key=key: inference.counts[key])
 
-                save_detection(species, conf)
+# ======================================================
+# AUDIO CALLBACK
+# ======================================================
 
-                # OPTIONAL:
-                # save_detection_audio(indata, species, conf)
-    else:
-        print("No detections")
+def audio_callback(indata, frames, time_info, status):
+    # Runs on the PortAudio thread: only hand the block over
+    with callback_seconds.time():
+        if status:
+            for flag, counter in audio_status.items():
+                if getattr(status, flag):
+                    counter.inc()
+        inference.submit(indata[:, 0])
 
 # ======================================================
 # AUDIO THREAD
@@ -173,7 +302,7 @@ def start_listener():
     with sd.InputStream(
         channels=1,
         samplerate=SAMPLE_RATE,
-        blocksize=SAMPLE_RATE * WINDOW_SECS,
+        blocksize=SAMPLE_RATE * HOP_SECS,
         dtype="float32",
         callback=audio_callback
     ):
@@ -187,6 +316,10 @@ threading.Thread(target=start_listener, daemon=True).start()
 # GIT AUTO COMMIT (SAFE)
 # ======================================================
 
+def run_git(command, *args, **kwargs):
+    with git_seconds[command].time():
+        return subprocess.run(["git", command, *args], **kwargs)
+
 def auto_git_committer():
     last_commit_hour = None
 
@@ -196,27 +329,31 @@ def auto_git_committer():
 
         if current_hour != last_commit_hour:
             try:
-                rotate_csv()
+                # No half-written rows while rotating and staging the shards
+                with writer.paused():
+                    rotate_csv()
+
+                    result = run_git(
+                        "status", "--porcelain", SHARD_DIR,
+                        capture_output=True,
+                        text=True
+                    )
 
-                result = subprocess.run(
-                    ["git", "status", "--porcelain", CSV_FILE],
-                    capture_output=True,
-                    text=True
-                )
+                    changed = result.stdout.strip() != ""
+                    if changed:
+                        run_git("add", SHARD_DIR, check=True)
 
-                if result.stdout.strip() == "":
+                if not changed:
                     print("[GIT] No changes")
                 else:
-                    print("[GIT] Committing CSV")
-
-                    subprocess.run(["git", "add", CSV_FILE], check=True)
+                    print("[GIT] Committing shards")
 
                     msg = f"Auto-commit {now.strftime('%Y-%m-%d %H:%M')}"
-                    subprocess.run(["git", "commit", "-m", msg], check=True)
+                    run_git("commit", "-m", msg, check=True)
 
-                    subprocess.run(["git", "push"], check=True)
+                    run_git("push", check=True)
 
-                    subprocess.run(["git", "gc", "--auto"], check=True)
+                    run_git("gc", "--auto", check=True)
 
                 last_commit_hour = current_hour
 
@@ -246,7 +383,7 @@ HTML_TEMPLATE = """
 
 def count_since(hours):
     cutoff = datetime.datetime.now() - datetime.timedelta(hours=hours)
-    return sum(1 for r in read_csv() if r["timestamp"] > cutoff)
+    return live_index.count(local_seconds(cutoff))
 
 @app.route("/")
 def dashboard():
@@ -255,6 +392,51 @@ def dashboard():
         s24=count_since(24)
     )
 
+def conditional_json(payload, etag, now):
+    # 304 when the client already has this version. The payload changes with
+    # new detections and when the windows slide at the minute (`now`), so
+    # Last-Modified is the later of the two, like the ETag
+    response = jsonify(payload)
+    response.set_etag(etag)
+    modified = max(live_index.last_modified or 0, now.timestamp())
+    response.last_modified = datetime.datetime.fromtimestamp(modified, datetime.timezone.utc)
+    response.headers["Cache-Control"] = "no-cache"
+    return response.make_conditional(request)
+
+@app.route("/api/counts")
+def api_counts():
+    # Counts only change with new detections or when the minute rolls over
+    now = datetime.datetime.now().replace(second=0, microsecond=0)
+    windows = {}
+    for name, hours in LIVE_WINDOWS.items():
+        start = local_seconds(now - datetime.timedelta(hours=hours))
+        windows[name] = {
+            "total": live_index.count(start),
+            "species": live_index.species_counts(start)
+        }
+    payload = {"as_of": now.isoformat(), "windows": windows}
+    return conditional_json(payload, f"{live_index.version}-{now:%Y%m%d%H%M}", now)
+
+@app.route("/api/counts/<window>")
+def api_counts_window(window):
+    if window not in LIVE_WINDOWS:
+        return jsonify({"error": f"unknown window {window}", "windows": list(LIVE_WINDOWS)}), 404
+    now = datetime.datetime.now().replace(second=0, microsecond=0)
+    start = local_seconds(now - datetime.timedelta(hours=LIVE_WINDOWS[window]))
+    payload = {
+        "as_of": now.isoformat(),
+        "window": window,
+        "total": live_index.count(start),
+        "species": live_index.species_counts(start)
+    }
+    return conditional_json(payload, f"{window}-{live_index.version}-{now:%Y%m%d%H%M}", now)
+
+@app.route("/metrics")
+def metrics_endpoint():
+    if not metrics.enabled:
+        return "metrics disabled\n", 404
+    return Response(metrics.render(), content_type="text/plain; version=0.0.4; charset=utf-8")
+
 # ======================================================
 # RUN
 # ======================================================
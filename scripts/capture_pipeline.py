@@ -0,0 +1,72 @@
+import queue
+import threading
+import time
+
+# Decouples audio capture from BirdNET inference. The sounddevice callback
+# only copies its block into a bounded queue; a worker thread runs the
+# (slow) analysis. When the worker falls behind, the queue either drops the
+# oldest block ("drop_oldest", capture never waits) or makes the producer
+# wait for a free slot ("block").
+
+class InferenceWorker:
+    def __init__(self, process, maxsize=4, policy="drop_oldest", late_after=None):
+        if policy not in ("drop_oldest", "block"):
+            raise ValueError(f"Unknown backpressure policy: {policy}")
+        self.process = process
+        self.policy = policy
+        self.late_after = late_after
+        self.queue = queue.Queue(maxsize=maxsize)
+        self.counts = {"enqueued": 0, "dropped": 0, "late": 0, "processed": 0, "errors": 0}
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def _count(self, key):
+        with self._lock:
+            self.counts[key] += 1
+
+    def submit(self, block):
+        # Called from the audio callback: copy, enqueue and return
+        item = (time.monotonic(), time.time(), block.copy())
+        if self.policy == "block":
+            self.queue.put(item)
+        else:
+            while True:
+                try:
+                    self.queue.put_nowait(item)
+                    break
+                except queue.Full:
+                    try:
+                        self.queue.get_nowait()
+                        self._count("dropped")
+                    except queue.Empty:
+                        pass
+        self._count("enqueued")
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self.counts)
+        stats["queue_depth"] = self.queue.qsize()
+        return stats
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        return self
+
+    def _run(self):
+        dropped = 0
+        while True:
+            captured, wall_time, block = self.queue.get()
+            if self.late_after is not None and time.monotonic() - captured > self.late_after:
+                self._count("late")
+            try:
+                # wall_time: epoch seconds at which the block was captured
+                self.process(block, wall_time)
+            except Exception as e:
+                self._count("errors")
+                print(f"[INFERENCE ERROR] {e}")
+            self._count("processed")
+
+            if self.counts["dropped"] != dropped:
+                dropped = self.counts["dropped"]
+                print(f"[INFERENCE] Falling behind: {dropped} blocks dropped, {self.counts['late']} late")
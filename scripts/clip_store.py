@@ -0,0 +1,207 @@
+import collections
+import datetime
+import json
+import os
+import queue
+import re
+import shutil
+import threading
+import time
+import numpy as np
+from scipy.io.wavfile import write as write_wav
+
+try:
+    import soundfile
+except ImportError:  # FLAC clips need the soundfile package
+    soundfile = None
+
+# Detection clips with bounded retention. The clips are kept in an index
+# ordered by age (one ordered dict per priority tier), persisted as an
+# append-only log next to the clips, so adding a clip and evicting the
+# oldest one are O(1) and never list the directory. Clips are encoded and
+# written by a background thread; free disk space is checked at most every
+# `free_check_secs`. Clips saved before there was an index are added to it
+# once, oldest first, when the index is created.
+
+# 20260221-061530-250_Merel_0.93.wav (before the index: no milliseconds)
+CLIP_NAME = re.compile(r"^(\d{8}-\d{6})(?:-\d{3})?_(.+)_(\d+\.\d+)\.(wav|flac)$")
+
+class ClipStore:
+    def __init__(self, directory, max_files=200, min_free_gb=5, fmt="wav", priority=None,
+                 free_check_secs=60, queue_size=32):
+        if fmt not in ("wav", "flac"):
+            raise ValueError(f"Unknown clip format: {fmt}")
+        if fmt == "flac" and soundfile is None:
+            raise ValueError("FLAC clips need the soundfile package")
+        self.directory = directory
+        self.max_files = max_files
+        self.min_free = min_free_gb * 1024**3
+        self.fmt = fmt
+        # priority(species, confidence) -> tier; lower tiers are evicted first
+        self.priority = priority or (lambda species, confidence: 0)
+        self.free_check_secs = free_check_secs
+        self.counts = {"saved": 0, "evicted": 0, "skipped": 0, "dropped": 0, "bytes": 0}
+        self._tiers = collections.defaultdict(collections.OrderedDict)
+        self._size = 0
+        self._free = None
+        self._free_checked = 0
+        self._lock = threading.Lock()
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._thread = None
+        os.makedirs(directory, exist_ok=True)
+        self._log_path = os.path.join(directory, "index.jsonl")
+        self._load()
+
+    # --- Index ---
+
+    def _scan(self):
+        # Records for the clips already in the directory, oldest first
+        records = []
+        for name in os.listdir(self.directory):
+            path = os.path.join(self.directory, name)
+            if not name.endswith((".wav", ".flac")) or not os.path.isfile(path):
+                continue
+            st = os.stat(path)
+            m = CLIP_NAME.match(name)
+            species, confidence = (m.group(2).replace("_", " "), float(m.group(3))) if m else ("", 0.0)
+            records.append({"name": name, "species": species, "confidence": confidence,
+                            "time": datetime.datetime.fromtimestamp(st.st_mtime).isoformat(), "bytes": st.st_size,
+                            "tier": self.priority(species, confidence), "mtime": st.st_mtime})
+        records.sort(key=lambda r: r.pop("mtime"))
+        return records
+
+    def _load(self):
+        # Replay the log, then drop entries whose files are gone
+        entries = collections.OrderedDict()
+        if not os.path.exists(self._log_path):
+            for record in self._scan():
+                entries[record["name"]] = record
+        else:
+            with open(self._log_path) as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        continue  # torn last line
+                    if record["op"] == "add":
+                        entries[record["name"]] = record
+                    else:
+                        entries.pop(record["name"], None)
+        for name, record in entries.items():
+            if os.path.exists(os.path.join(self.directory, name)):
+                self._tiers[record["tier"]][name] = record
+                self._size += 1
+        self._compact()
+        while self._size > self.max_files:
+            self._evict_one()
+
+    def _compact(self):
+        tmp = self._log_path + ".tmp"
+        with open(tmp, "w") as f:
+            for tier in sorted(self._tiers):
+                for record in self._tiers[tier].values():
+                    f.write(json.dumps(dict(record, op="add")) + "\n")
+        os.replace(tmp, self._log_path)
+        self._log = open(self._log_path, "a")
+        self._log_records = self._size
+
+    def _append(self, record):
+        self._log.write(json.dumps(record) + "\n")
+        self._log.flush()
+        self._log_records += 1
+
+    def _evict_one(self):
+        tier = min(t for t, clips in self._tiers.items() if clips)
+        name, _ = self._tiers[tier].popitem(last=False)
+        self._size -= 1
+        try:
+            os.remove(os.path.join(self.directory, name))
+        except OSError:
+            pass
+        self._append({"op": "del", "name": name})
+        self.counts["evicted"] += 1
+
+    def _add(self, record):
+        with self._lock:
+            self._tiers[record["tier"]][record["name"]] = record
+            self._size += 1
+            self._append(dict(record, op="add"))
+            while self._size > self.max_files:
+                self._evict_one()
+            if self._log_records > 4 * max(self._size, self.max_files):
+                self._log.close()
+                self._compact()
+
+    def clips(self):
+        # Oldest first within each tier, lowest tier first
+        with self._lock:
+            return [r for t in sorted(self._tiers) for r in self._tiers[t].values()]
+
+    # --- Disk space ---
+
+    def disk_ok(self):
+        now = time.monotonic()
+        if self._free is None or now - self._free_checked > self.free_check_secs:
+            self._free = shutil.disk_usage(self.directory).free
+            self._free_checked = now
+        return self._free > self.min_free
+
+    # --- Writing ---
+
+    def save(self, samples, rate, species, confidence, ts, segment=None, padding=0.5):
+        # segment: (start, end) seconds of the call within `samples`
+        if not self.disk_ok():
+            self.counts["skipped"] += 1
+            return None
+        if segment is not None:
+            lo = max(0, int((segment[0] - padding) * rate))
+            hi = min(len(samples), int(np.ceil((segment[1] + padding) * rate)))
+            samples = samples[lo:hi]
+        safe_species = species.replace(" ", "_").replace("/", "_")
+        name = f"{ts.strftime('%Y%m%d-%H%M%S-%f')[:-3]}_{safe_species}_{confidence:.2f}.{self.fmt}"
+        item = (name, np.array(samples, dtype=np.float32), rate, species, confidence, ts.isoformat())
+        try:
+            self._queue.put_nowait(item)
+        except queue.Full:
+            self.counts["dropped"] += 1
+            return None
+        return name
+
+    def _write(self, name, samples, rate, species, confidence, ts):
+        path = os.path.join(self.directory, name)
+        if self.fmt == "flac":
+            soundfile.write(path + ".tmp", samples, rate, format="FLAC", subtype="PCM_16")
+        else:
+            write_wav(path + ".tmp", rate, samples)
+        os.replace(path + ".tmp", path)
+        size = os.path.getsize(path)
+        if self._free is not None:
+            self._free -= size
+        self.counts["saved"] += 1
+        self.counts["bytes"] += size
+        self._add({"name": name, "species": species, "confidence": round(float(confidence), 4),
+                   "time": ts, "bytes": size, "tier": self.priority(species, confidence)})
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                break
+            try:
+                self._write(*item)
+            except Exception as e:
+                print(f"[AUDIO ERROR] {e}")
+            finally:
+                self._queue.task_done()
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        return self
+
+    def close(self):
+        if self._thread is not None:
+            self._queue.put(None)
+            self._thread.join()
+            self._thread = None
+        self._log.close()
@@ -0,0 +1,127 @@
+import contextlib
+import csv
+import io
+import os
+import queue
+import threading
+import time
+
+# Long-lived, batched writer for detections.
+#
+# Rows are collected in memory and appended to the CSV in one write once
+# `max_rows` are pending or the oldest row is `max_age` seconds old, and on
+# close(). Only complete lines are ever written. `fsync` is "never" (leave it
+# to the OS), "flush" (fsync after every batch) or "close". `on_flush` gets
+# each written batch, e.g. to update the columnar store. It runs on a thread
+# of its own, in batch order, so a flush from add() never makes the caller
+# (the inference loop) wait for it; close() waits for the pending batches.
+#
+# rotate_csv() and the git committer run inside `with writer.paused():`,
+# which flushes, closes the file handle and holds off further writes until
+# the block is done, so a rotated or committed file never ends mid-row.
+
+FIELDNAMES = ["timestamp", "species", "confidence"]
+
+class DetectionWriter:
+    def __init__(self, csv_file, on_flush=None, max_rows=50, max_age=30.0, fsync="never"):
+        if fsync not in ("never", "flush", "close"):
+            raise ValueError(f"Unknown fsync policy: {fsync}")
+        self.csv_file = csv_file
+        self.on_flush = on_flush
+        self.max_rows = max_rows
+        self.max_age = max_age
+        self.fsync = fsync
+        self.counts = {"rows": 0, "flushes": 0, "bytes": 0}
+        self._rows = []
+        self._oldest = None
+        self._file = None
+        self._lock = threading.RLock()
+        self._thread = None
+        self._batches = queue.Queue()
+        if on_flush is not None:
+            threading.Thread(target=self._deliver, daemon=True).start()
+
+    def add(self, ts, species, confidence):
+        with self._lock:
+            if self._oldest is None:
+                self._oldest = time.monotonic()
+            self._rows.append({"timestamp": ts, "species": species, "confidence": confidence})
+            if len(self._rows) >= self.max_rows:
+                self._flush()
+
+    def flush(self):
+        with self._lock:
+            self._flush()
+
+    def _open(self):
+        if self._file is None:
+            self._file = open(self.csv_file, "a", newline="", encoding="utf-8")
+        return self._file
+
+    def _flush(self):
+        if len(self._rows) == 0:
+            return
+        f = self._open()
+        buf = io.StringIO()
+        writer = csv.DictWriter(buf, fieldnames=FIELDNAMES)
+        if f.tell() == 0:
+            writer.writeheader()
+        writer.writerows(self._rows)
+        data = buf.getvalue()
+        f.write(data)
+        f.flush()
+        if self.fsync == "flush":
+            os.fsync(f.fileno())
+
+        rows, self._rows, self._oldest = self._rows, [], None
+        self.counts["rows"] += len(rows)
+        self.counts["flushes"] += 1
+        self.counts["bytes"] += len(data.encode("utf-8"))
+        if self.on_flush is not None:
+            # Queued under the lock, so batches arrive in order
+            self._batches.put(rows)
+
+    def _deliver(self):
+        while True:
+            rows = self._batches.get()
+            try:
+                self.on_flush(rows)
+            except Exception as e:
+                print(f"[WRITER ERROR] {e}")
+            finally:
+                self._batches.task_done()
+
+    def _close_file(self):
+        if self._file is not None:
+            if self.fsync != "never":
+                os.fsync(self._file.fileno())
+            self._file.close()
+            self._file = None
+
+    @contextlib.contextmanager
+    def paused(self):
+        with self._lock:
+            self._flush()
+            self._close_file()
+            # The committed files include what on_flush writes
+            self._batches.join()
+            yield
+
+    def close(self):
+        with self._lock:
+            self._flush()
+            self._close_file()
+        self._batches.join()
+
+    def start(self):
+        # --- Background flush of batches older than max_age ---
+        def run():
+            while True:
+                time.sleep(min(1.0, self.max_age))
+                with self._lock:
+                    if self._oldest is not None and time.monotonic() - self._oldest >= self.max_age:
+                        self._flush()
+
+        self._thread = threading.Thread(target=run, daemon=True)
+        self._thread.start()
+        return self
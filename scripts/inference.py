@@ -0,0 +1,22 @@
+from math import gcd
+import numpy as np
+from scipy.signal import resample_poly
+from birdnetlib import RecordingBuffer
+
+# In-memory BirdNET analysis: the captured float32 window is resampled to
+# the model rate once (polyphase, vectorized) and handed to birdnetlib as a
+# buffer, without a temporary WAV file in between.
+MODEL_RATE = 48000
+
+def resample(samples, rate, target=MODEL_RATE):
+    samples = np.asarray(samples, dtype=np.float32)
+    if rate == target:
+        return samples
+    g = gcd(rate, target)
+    return resample_poly(samples, target // g, rate // g).astype(np.float32, copy=False)
+
+def analyze_buffer(analyzer, samples, rate, **kwargs):
+    # samples: 1-D numpy array or memoryview of float32 mono audio
+    rec = RecordingBuffer(analyzer, resample(samples, rate), MODEL_RATE, **kwargs)
+    rec.analyze()
+    return rec.detections
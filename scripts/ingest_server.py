@@ -0,0 +1,119 @@
+import atexit
+import os
+import re
+import sys
+from flask import Flask, request, jsonify, Response
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from detectionStore import appendDetections
+from rollups import addDetections
+from shardStore import appendShards
+import bouts
+from metrics import Metrics
+from station_merger import StationMerger
+from writeLock import writeLock
+
+# Central ingestion for several recorders. Every recorder (bird_dashboard.py
+# with INGEST_URL set) posts its detection batches tagged with its station id:
+#
+#   POST /ingest  {"station": "garden", "detections": [
+#                     {"timestamp": "2026-02-21T06:15:30.250", "species": "Merel", "confidence": 0.91}, ...]}
+#
+# The batches of all stations are merged in time order (StationMerger) and
+# written together, so the store, shards, rollups and bouts get one write
+# per release instead of one per station batch. The dashboard may write the
+# same data directory; the writes of both hold the data directory's write
+# lock (writeLock.py).
+#
+#   python ingest_server.py
+
+app = Flask(__name__)
+
+# ======================================================
+# CONFIG
+# ======================================================
+STORE_DIR = "../data/store"
+ROLLUP_DIR = "../data/rollups"
+BOUT_DIR = "../data/bouts"
+SHARD_DIR = "../data/shards"
+
+# Merge buffer: seconds a station may send out of order, rows held at most,
+# seconds without batches after which a station stops holding back the others
+LATENESS_SECS = 60
+MAX_BUFFER_ROWS = 50000
+STATION_IDLE_SECS = 300
+RELEASE_SECS = 5
+MAX_BATCH_ROWS = 10000
+
+STATION_ID = re.compile(r"^[A-Za-z0-9_.-]{1,64}$")
+
+METRICS_ENABLED = True
+PORT = 4100
+
+# ======================================================
+# WRITES
+# ======================================================
+
+metrics = Metrics(enabled=METRICS_ENABLED)
+release_seconds = metrics.histogram("ingest_release_seconds", "Time to write one merged release",
+                                    buckets=(0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10))
+batch_rows = metrics.histogram("ingest_batch_rows", "Detections per received batch",
+                               buckets=(1, 5, 10, 50, 100, 500, 1000, 5000))
+
+def store_release(batch):
+    # One time-ordered batch of all stations into the shards, store, rollups and bouts
+    with release_seconds.time(), writeLock(os.path.dirname(STORE_DIR)):
+        appendShards(batch, root=SHARD_DIR)
+        appendDetections(batch, root=STORE_DIR)
+        addDetections(batch, root=ROLLUP_DIR)
+        bouts.addDetections(batch, root=BOUT_DIR)
+
+merger = StationMerger(
+    store_release,
+    lateness=LATENESS_SECS,
+    max_rows=MAX_BUFFER_ROWS,
+    idle_secs=STATION_IDLE_SECS,
+    interval=RELEASE_SECS
+).start()
+atexit.register(merger.close)
+for name, help in [("accepted", "Detections accepted"), ("rejected", "Detections with an invalid timestamp or confidence"),
+                   ("late", "Detections older than rows already written"), ("released", "Detections written"),
+                   ("forced", "Detections written early because the merge buffer was full"),
+                   ("releases", "Merged writes")]:
+    metrics.counter(f"ingest_{name}", help, fn=lambda name=name: merger.counts[name])
+metrics.gauge("ingest_pending", "Detections waiting in the merge buffer", fn=merger.pending)
+metrics.gauge("ingest_stations", "Stations that have sent detections", fn=lambda: len(merger.stations()))
+
+# ======================================================
+# API
+# ======================================================
+
+@app.route("/ingest", methods=["POST"])
+def ingest():
+    payload = request.get_json(silent=True)
+    if not isinstance(payload, dict) or not isinstance(payload.get("detections"), list):
+        return jsonify({"error": "expected {\"station\": ..., \"detections\": [...]}"}), 400
+    station = str(payload.get("station", ""))
+    if not STATION_ID.match(station):
+        return jsonify({"error": f"invalid station id {station!r}"}), 400
+    if len(payload["detections"]) > MAX_BATCH_ROWS:
+        return jsonify({"error": f"at most {MAX_BATCH_ROWS} detections per batch"}), 413
+    batch_rows.observe(len(payload["detections"]))
+    try:
+        accepted, late = merger.add(station, payload["detections"])
+    except (KeyError, TypeError, ValueError) as e:
+        return jsonify({"error": f"malformed detections: {e}"}), 400
+    return jsonify({"accepted": accepted, "late": late, "pending": merger.pending()})
+
+@app.route("/stations")
+def stations():
+    return jsonify({station: ts.isoformat() for station, ts in merger.stations().items()})
+
+@app.route("/metrics")
+def metrics_endpoint():
+    if not metrics.enabled:
+        return "metrics disabled\n", 404
+    return Response(metrics.render(), content_type="text/plain; version=0.0.4; charset=utf-8")
+
+if __name__ == "__main__":
+    app.run(host="0.0.0.0", port=PORT, threaded=True)
@@ -0,0 +1,73 @@
+import threading
+import time
+import numpy as np
+
+# In-memory index of recent detections for the dashboard: a sorted array
+# of epoch timestamps with a parallel array of species codes. Range counts
+# are two binary searches, per-species counts a bincount over the range.
+
+class LiveIndex:
+    def __init__(self, retention=7 * 24 * 3600, capacity=4096):
+        self.retention = retention
+        self._ts = np.empty(capacity, dtype=np.float64)
+        self._codes = np.empty(capacity, dtype=np.int32)
+        self._n = 0
+        self._species = {}
+        self._names = []
+        self._lock = threading.Lock()
+        self.version = 0
+        self.last_modified = None
+
+    def _code(self, species):
+        code = self._species.get(species)
+        if code is None:
+            code = self._species[species] = len(self._names)
+            self._names.append(species)
+        return code
+
+    def _grow(self):
+        if self._n < len(self._ts):
+            return
+        # Drop expired detections first, double the arrays if still full
+        keep = np.searchsorted(self._ts[:self._n], self._ts[self._n - 1] - self.retention)
+        self._ts[:self._n - keep] = self._ts[keep:self._n]
+        self._codes[:self._n - keep] = self._codes[keep:self._n]
+        self._n -= keep
+        if self._n * 2 > len(self._ts):
+            self._ts = np.resize(self._ts, 2 * len(self._ts))
+            self._codes = np.resize(self._codes, 2 * len(self._codes))
+
+    def add(self, ts, species):
+        # ts: epoch seconds
+        with self._lock:
+            self._grow()
+            code = self._code(species)
+            # Detections normally arrive in order; insert in place otherwise
+            i = self._n if self._n == 0 or ts >= self._ts[self._n - 1] else np.searchsorted(self._ts[:self._n], ts, side="right")
+            self._ts[i + 1:self._n + 1] = self._ts[i:self._n]
+            self._codes[i + 1:self._n + 1] = self._codes[i:self._n]
+            self._ts[i] = ts
+            self._codes[i] = code
+            self._n += 1
+            self.version += 1
+            self.last_modified = time.time()
+
+    def load(self, timestamps, species):
+        for ts, name in sorted(zip(timestamps, species)):
+            self.add(ts, name)
+
+    def count(self, start, end=None):
+        with self._lock:
+            ts = self._ts[:self._n]
+            lo = np.searchsorted(ts, start, side="left")
+            hi = self._n if end is None else np.searchsorted(ts, end, side="left")
+            return int(hi - lo)
+
+    def species_counts(self, start, end=None):
+        with self._lock:
+            ts = self._ts[:self._n]
+            lo = np.searchsorted(ts, start, side="left")
+            hi = self._n if end is None else np.searchsorted(ts, end, side="left")
+            counts = np.bincount(self._codes[lo:hi], minlength=len(self._names))
+            order = np.argsort(-counts, kind="stable")
+            return {self._names[c]: int(counts[c]) for c in order if counts[c] > 0}
@@ -0,0 +1,153 @@
+import bisect
+import threading
+import time
+
+# Counters, gauges and histograms for the capture pipeline, rendered in the
+# Prometheus text format. A disabled registry hands out shared no-op
+# metrics, so instrumented code only pays for an attribute lookup and an
+# empty call.
+
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+def _labelText(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{k}="{v}"' for k, v in sorted(labels.items())) + "}"
+
+def _labelsWith(labels, key, value):
+    merged = dict(labels)
+    merged[key] = value
+    return _labelText(merged)
+
+class _Timer:
+    def __init__(self, histogram):
+        self.histogram = histogram
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self.start)
+
+class Counter:
+    kind = "counter"
+
+    def __init__(self, labels=None, fn=None):
+        # fn: read the value from an existing counter instead
+        self.labels = labels or {}
+        self.value = 0
+        self.fn = fn
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1):
+        with self._lock:
+            self.value += amount
+
+    def samples(self, name):
+        yield f"{name}{_labelText(self.labels)} {self.fn() if self.fn else self.value}"
+
+class Gauge:
+    kind = "gauge"
+
+    def __init__(self, labels=None, fn=None):
+        self.labels = labels or {}
+        self.value = 0
+        self.fn = fn
+
+    def set(self, value):
+        self.value = value
+
+    def samples(self, name):
+        yield f"{name}{_labelText(self.labels)} {self.fn() if self.fn else self.value}"
+
+class Histogram:
+    kind = "histogram"
+
+    def __init__(self, labels=None, buckets=DEFAULT_BUCKETS):
+        self.labels = labels or {}
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        i = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[i] += 1
+            self.sum += value
+
+    def time(self):
+        return _Timer(self)
+
+    def samples(self, name):
+        with self._lock:
+            counts, total = list(self.counts), self.sum
+        cumulative = 0
+        for bound, count in zip(self.buckets, counts):
+            cumulative += count
+            yield f"{name}_bucket{_labelsWith(self.labels, 'le', bound)} {cumulative}"
+        cumulative += counts[-1]
+        yield f"{name}_bucket{_labelsWith(self.labels, 'le', '+Inf')} {cumulative}"
+        yield f"{name}_sum{_labelText(self.labels)} {total}"
+        yield f"{name}_count{_labelText(self.labels)} {cumulative}"
+
+class _NullTimer:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+class _NullMetric:
+    # Stands in for every metric type when metrics are disabled
+    _timer = _NullTimer()
+
+    def inc(self, amount=1):
+        pass
+
+    def set(self, value):
+        pass
+
+    def observe(self, value):
+        pass
+
+    def time(self):
+        return self._timer
+
+NULL_METRIC = _NullMetric()
+
+class Metrics:
+    def __init__(self, enabled=True, prefix="birdnet_"):
+        self.enabled = enabled
+        self.prefix = prefix
+        self._families = {}
+
+    def _register(self, name, help, metric):
+        if not self.enabled:
+            return NULL_METRIC
+        # Counter families are named for their samples, with the _total suffix
+        if metric.kind == "counter":
+            name += "_total"
+        family = self._families.setdefault(self.prefix + name, {"help": help, "kind": metric.kind, "series": []})
+        family["series"].append(metric)
+        return metric
+
+    def counter(self, name, help, labels=None, fn=None):
+        return self._register(name, help, Counter(labels, fn))
+
+    def gauge(self, name, help, labels=None, fn=None):
+        return self._register(name, help, Gauge(labels, fn))
+
+    def histogram(self, name, help, labels=None, buckets=DEFAULT_BUCKETS):
+        return self._register(name, help, Histogram(labels, buckets))
+
+    def render(self):
+        # --- Prometheus text exposition format ---
+        lines = []
+        for name, family in self._families.items():
+            lines.append(f"# HELP {name} {family['help']}")
+            lines.append(f"# TYPE {name} {family['kind']}")
+            for metric in family["series"]:
+                lines.extend(metric.samples(name))
+        return "\n".join(lines) + "\n"
@@ -0,0 +1,196 @@
+import argparse
+import datetime
+import hashlib
+import json
+import multiprocessing
+import os
+import re
+import sys
+import time
+import numpy as np
+import pandas as pd
+from scipy.io import wavfile
+
+try:
+    import soundfile
+except ImportError:  # FLAC input needs the soundfile package
+    soundfile = None
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from detectionStore import replaceDetections
+from rollups import buildRollups, listRollups, readMeta
+import bouts
+from writeLock import writeLock
+
+# Offline re-analysis of saved recordings, e.g. after a model, labels or
+# threshold change. The files are spread over a process pool whose workers
+# load the analyzer once; the detections of each file replace the store's
+# detections in the time span of that recording. A checkpoint records every
+# finished file, so an interrupted backfill resumes where it stopped.
+#
+#   python reanalyze.py RECORDINGS_DIR --model model.tflite --labels nl.txt
+
+STORE_DIR = "../data/store"
+ROLLUP_DIR = "../data/rollups"
+BOUT_DIR = "../data/bouts"
+CHECKPOINT = "../data/.cache/reanalyze.json"
+CONFIDENCE_THRESHOLD = 0.5
+CHUNK_SECS = 600  # audio per analyzer call, bounds worker memory
+EXTENSIONS = (".wav", ".flac")
+
+# Leading 20260221-061530 or 20260221-061530-250 in the file name
+NAME_TIME = re.compile(r"^(\d{8}-\d{6})(?:-(\d{3}))?")
+
+def recording_start(path):
+    # --- Start time from the file name, else the modification time ---
+    m = NAME_TIME.match(os.path.basename(path))
+    if m:
+        start = datetime.datetime.strptime(m.group(1), "%Y%m%d-%H%M%S")
+        return start + datetime.timedelta(milliseconds=int(m.group(2) or 0))
+    return datetime.datetime.fromtimestamp(os.path.getmtime(path))
+
+def read_chunks(path, chunk_secs=CHUNK_SECS):
+    # --- (offset seconds, float32 mono samples, rate) per chunk ---
+    if path.lower().endswith(".flac"):
+        if soundfile is None:
+            raise RuntimeError("FLAC input needs the soundfile package")
+        rate = soundfile.info(path).samplerate
+        for i, block in enumerate(soundfile.blocks(path, blocksize=rate * chunk_secs, dtype="float32", always_2d=True)):
+            yield i * chunk_secs, block.mean(axis=1), rate
+        return
+    rate, data = wavfile.read(path, mmap=True)
+    for start in range(0, len(data), rate * chunk_secs):
+        block = np.asarray(data[start:start + rate * chunk_secs])
+        if block.ndim > 1:
+            block = block.mean(axis=1)
+        if np.issubdtype(block.dtype, np.integer):
+            block = block.astype(np.float32) / np.iinfo(data.dtype).max
+        yield start / rate, block.astype(np.float32, copy=False), rate
+
+# --- Worker process ---
+
+_analyzer = None
+_threshold = None
+
+def _init_worker(model, labels, threshold):
+    global _analyzer, _threshold
+    from birdnetlib.analyzer import Analyzer
+    _analyzer = Analyzer(classifier_model_path=model, classifier_labels_path=labels)
+    _threshold = threshold
+
+def analyze_file(path):
+    # Returns (path, audio seconds, detections or None on error)
+    from inference import analyze_buffer
+    start = recording_start(path)
+    rows, seconds = [], 0.0
+    try:
+        for offset, samples, rate in read_chunks(path):
+            seconds += len(samples) / rate
+            for d in analyze_buffer(_analyzer, samples, rate):
+                if d["common_name"].lower() == "human vocal" or d["confidence"] < _threshold:
+                    continue
+                ts = start + datetime.timedelta(seconds=offset + d["start_time"])
+                rows.append({"timestamp": ts.isoformat(), "species": d["common_name"], "confidence": d["confidence"]})
+    except Exception as e:
+        print(f"[REANALYZE ERROR] {path}: {e}")
+        return path, 0.0, None
+    return path, seconds, rows
+
+# --- Driver ---
+
+def fingerprint(model, labels, threshold):
+    # A new model, labels file or threshold starts a fresh checkpoint
+    h = hashlib.sha256()
+    for path in (model, labels):
+        st = os.stat(path)
+        h.update(f"{os.path.abspath(path)}:{st.st_size}:{st.st_mtime}".encode())
+    h.update(str(threshold).encode())
+    return h.hexdigest()[:16]
+
+def load_checkpoint(path, key):
+    try:
+        with open(path) as f:
+            checkpoint = json.load(f)
+    except (FileNotFoundError, ValueError):
+        checkpoint = None
+    if checkpoint is None or checkpoint.get("fingerprint") != key:
+        checkpoint = {"fingerprint": key, "files": {}}
+    return checkpoint
+
+def save_checkpoint(checkpoint, path):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path + ".tmp", "w") as f:
+        json.dump(checkpoint, f)
+    os.replace(path + ".tmp", path)
+
+def find_recordings(directory):
+    found = []
+    for root, _, names in os.walk(directory):
+        for name in names:
+            if name.lower().endswith(EXTENSIONS):
+                found.append(os.path.join(root, name))
+    return sorted(found)
+
+def file_key(path):
+    st = os.stat(path)
+    return {"size": st.st_size, "mtime": st.st_mtime}
+
+def reanalyze(directory, model, labels, workers=None, threshold=CONFIDENCE_THRESHOLD,
+              store=STORE_DIR, checkpoint_path=CHECKPOINT, rollups=ROLLUP_DIR, bout_dir=BOUT_DIR):
+    checkpoint = load_checkpoint(checkpoint_path, fingerprint(model, labels, threshold))
+    done = checkpoint["files"]
+    todo = [p for p in find_recordings(directory)
+            if done.get(os.path.relpath(p, directory), {}).get("key") != file_key(p)]
+    print(f"[REANALYZE] {len(todo)} recordings to analyze, {len(done)} already done")
+    if len(todo) == 0:
+        return checkpoint
+
+    started = time.time()
+    audio_seconds, detections = 0.0, 0
+    workers = workers or os.cpu_count()
+    with multiprocessing.Pool(workers, initializer=_init_worker, initargs=(model, labels, threshold)) as pool:
+        for n, (path, seconds, rows) in enumerate(pool.imap_unordered(analyze_file, todo), 1):
+            if rows is None:
+                continue  # not checkpointed, retried on the next run
+            # Store first, then checkpoint: a crash in between only repeats
+            # this file, which replaces the same span again
+            start = recording_start(path)
+            df = pd.DataFrame(rows, columns=["timestamp", "species", "confidence"])
+            # isoformat() leaves out whole-second microseconds
+            df["timestamp"] = pd.to_datetime(df["timestamp"], format="ISO8601")
+            with writeLock(os.path.dirname(store)):
+                replaceDetections(df, start, start + datetime.timedelta(seconds=seconds), root=store)
+            done[os.path.relpath(path, directory)] = {"key": file_key(path), "seconds": seconds, "detections": len(rows)}
+            save_checkpoint(checkpoint, checkpoint_path)
+
+            audio_seconds += seconds
+            detections += len(rows)
+            wall = time.time() - started
+            print(f"[REANALYZE] {n}/{len(todo)} {os.path.basename(path)}: {len(rows)} detections | "
+                  f"{audio_seconds / 3600:.2f} audio-h in {wall / 3600:.2f} h = "
+                  f"{audio_seconds / max(wall, 1e-9):.1f} audio-h per wall-h")
+
+    # The cubes and bouts are incremental; rebuild them from the store
+    with writeLock(os.path.dirname(store)):
+        for path in listRollups(rollups):
+            meta = readMeta(path)
+            buildRollups(meta["confidence_threshold"], meta["exclude"], root=rollups, storeRoot=store,
+                         thresholds=meta.get("thresholds"))
+        state = bouts.readState(bout_dir)
+        if state is not None:
+            bouts.buildBouts(state["confidence_threshold"], state["exclude"], state["gap"], root=bout_dir,
+                             storeRoot=store, thresholds=state.get("thresholds"))
+    print(f"[REANALYZE] {detections} detections from {audio_seconds / 3600:.2f} audio-h")
+    return checkpoint
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Re-analyze saved recordings into the detection store")
+    parser.add_argument("directory", help="folder with WAV/FLAC recordings (searched recursively)")
+    parser.add_argument("--model", required=True, help="path to the BirdNET .tflite model")
+    parser.add_argument("--labels", required=True, help="path to the labels file")
+    parser.add_argument("--workers", type=int, default=None, help="worker processes (default: all cores)")
+    parser.add_argument("--threshold", type=float, default=CONFIDENCE_THRESHOLD)
+    parser.add_argument("--store", default=STORE_DIR)
+    parser.add_argument("--checkpoint", default=CHECKPOINT)
+    args = parser.parse_args()
+    reanalyze(args.directory, args.model, args.labels, args.workers, args.threshold, args.store, args.checkpoint)
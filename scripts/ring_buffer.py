@@ -0,0 +1,88 @@
+import numpy as np
+
+# Preallocated audio ring buffer with overlapping analysis windows.
+#
+# Every sample is stored twice (at i and i + capacity), so the most recent
+# n <= capacity samples are always one contiguous slice and windows can be
+# returned as views without copying. A view stays valid until the next
+# write() wraps over it, so windows have to be analysed before more audio
+# is pushed (the inference worker does both on the same thread).
+
+class RingBuffer:
+    def __init__(self, capacity, dtype=np.float32):
+        self.capacity = capacity
+        self._data = np.zeros(2 * capacity, dtype=dtype)
+        self._pos = 0
+        self.total = 0
+
+    def write(self, block):
+        block = np.asarray(block)[-self.capacity:]
+        n = len(block)
+        head = min(n, self.capacity - self._pos)
+        for start, part in ((self._pos, block[:head]), (0, block[head:])):
+            if len(part) == 0:
+                continue
+            self._data[start:start + len(part)] = part
+            self._data[start + self.capacity:start + self.capacity + len(part)] = part
+        self._pos = (self._pos + n) % self.capacity
+        self.total += n
+
+    def latest(self, n):
+        # View of the newest n samples
+        end = self._pos + self.capacity
+        return self._data[end - n:end]
+
+class SlidingWindows:
+    def __init__(self, window, hop, dtype=np.float32):
+        if hop > window:
+            raise ValueError("hop must not exceed the window length")
+        self.window = window
+        self.hop = hop
+        self.ring = RingBuffer(window, dtype=dtype)
+        self._next_end = window
+
+    def push(self, block):
+        # --- Yield (view, samples after the window end) for each completed window ---
+        block = np.asarray(block)
+        while len(block) > 0:
+            # Never write past the next window end, so its samples are not overwritten
+            n = min(len(block), self._next_end - self.ring.total)
+            self.ring.write(block[:n])
+            block = block[n:]
+            if self.ring.total == self._next_end:
+                yield self.ring.latest(self.window), len(block)
+                self._next_end += self.hop
+
+class DetectionMerger:
+    # Overlapping windows report the same call several times. A hit of a
+    # species that overlaps the interval of its open call is merged into it
+    # (highest confidence wins), otherwise it starts a new call. The interval
+    # is not extended, so a continuous song still gives one call per window
+    # length, like non-overlapping windows did. A call is released once a
+    # window starts after its end, when no later window can still contain it.
+
+    def __init__(self):
+        self._open = {}
+
+    def add(self, window_start, detections):
+        done = self.flush(window_start)
+        for d in detections:
+            start = window_start + d["start_time"]
+            end = window_start + d["end_time"]
+            call = self._open.get(d["common_name"])
+            if call is not None and start < call["end"]:
+                call["confidence"] = max(call["confidence"], d["confidence"])
+            else:
+                if call is not None:
+                    done.append(call)
+                self._open[d["common_name"]] = {
+                    "species": d["common_name"], "start": start, "end": end, "confidence": d["confidence"]
+                }
+        return done
+
+    def flush(self, before=None):
+        # Release the calls ending before `before` (all calls when None)
+        done = [c for c in self._open.values() if before is None or c["end"] <= before]
+        for c in done:
+            del self._open[c["species"]]
+        return done
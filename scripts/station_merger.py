@@ -0,0 +1,123 @@
+import threading
+import time
+import pandas as pd
+
+# Merges the detection streams of several stations into one time-ordered
+# stream.
+#
+# Each station sends its detections in (roughly) time order, but the
+# stations are not in step with each other. Rows are held until every
+# active station has sent detections past them (the watermark: the oldest
+# of the stations' newest timestamps, minus `lateness` seconds for rows a
+# station sends out of order) and are then released oldest first, all
+# stations together, in one on_release() call. A station that has sent
+# nothing for `idle_secs` no longer holds the watermark back. The buffer is
+# bounded: above `max_rows` the oldest rows are released regardless of the
+# watermark. Rows older than what was already released are still passed on
+# and counted as late.
+
+COLUMNS = ["timestamp", "species", "confidence", "station"]
+
+class StationMerger:
+    def __init__(self, on_release, lateness=60, max_rows=50000, idle_secs=300, interval=5.0):
+        self.on_release = on_release
+        self.lateness = pd.Timedelta(seconds=lateness)
+        self.max_rows = max_rows
+        self.idle_secs = idle_secs
+        self.interval = interval
+        self.counts = {"accepted": 0, "rejected": 0, "late": 0, "released": 0, "forced": 0, "releases": 0}
+        self._frames = []
+        self._pending = 0
+        self._newest = {}     # station -> newest timestamp received
+        self._seen = {}       # station -> monotonic time of the last batch
+        self._released = None # newest timestamp released so far
+        self._lock = threading.Lock()
+        self._release_lock = threading.Lock()
+        self._thread = None
+
+    def add(self, station, rows):
+        # --- Buffer a batch of one station; returns (accepted, late) ---
+        df = pd.DataFrame(rows, columns=COLUMNS[:3])
+        df["timestamp"] = pd.to_datetime(df["timestamp"], errors="coerce", format="ISO8601")
+        df["confidence"] = pd.to_numeric(df["confidence"], errors="coerce")
+        valid = df.dropna()
+        valid = valid.assign(station=station)
+        with self._lock:
+            self.counts["rejected"] += len(df) - len(valid)
+            if len(valid) == 0:
+                return 0, 0
+            late = 0 if self._released is None else int((valid["timestamp"] < self._released).sum())
+            self._frames.append(valid)
+            self._pending += len(valid)
+            newest = valid["timestamp"].max()
+            self._newest[station] = max(self._newest.get(station, newest), newest)
+            self._seen[station] = time.monotonic()
+            self.counts["accepted"] += len(valid)
+            self.counts["late"] += late
+            full = self._pending > self.max_rows
+        if full:
+            self.release()
+        return len(valid), late
+
+    def pending(self):
+        return self._pending
+
+    def stations(self):
+        with self._lock:
+            return dict(self._newest)
+
+    def watermark(self):
+        # Rows up to here are complete for every active station
+        now = time.monotonic()
+        active = [ts for station, ts in self._newest.items() if now - self._seen[station] <= self.idle_secs]
+        if len(active) == 0:
+            return None if len(self._newest) == 0 else max(self._newest.values())
+        return min(active) - self.lateness
+
+    def release(self, flush=False):
+        # --- Hand the complete rows (all rows with flush) to on_release ---
+        with self._release_lock:
+            with self._lock:
+                if self._pending == 0:
+                    return 0
+                taken = len(self._frames)
+                df = pd.concat(self._frames, ignore_index=True).sort_values("timestamp", kind="stable")
+                cut = len(df) if flush else int(df["timestamp"].searchsorted(self.watermark(), side="right"))
+                # Bounded buffer: keep at most half of max_rows back
+                forced = max(0, len(df) - self.max_rows // 2 - cut) if len(df) > self.max_rows else 0
+                cut += forced
+                out, rest = df.iloc[:cut], df.iloc[cut:]
+                if len(out) == 0:
+                    return 0
+            # Outside the buffer lock, so stations can keep sending; the
+            # release lock keeps the batches in order. The rows stay in the
+            # buffer until on_release returns, so a failed write is retried
+            # with the next release.
+            self.on_release(out.assign(timestamp=out["timestamp"].dt.strftime("%Y-%m-%dT%H:%M:%S.%f"))
+                            .reset_index(drop=True))
+            with self._lock:
+                self._frames = ([rest] if len(rest) else []) + self._frames[taken:]
+                self._pending -= len(out)
+                newest = out["timestamp"].iloc[-1]
+                self._released = newest if self._released is None else max(self._released, newest)
+                self.counts["released"] += len(out)
+                self.counts["forced"] += forced
+                self.counts["releases"] += 1
+            return len(out)
+
+    def start(self):
+        # --- Background release every `interval` seconds ---
+        def run():
+            while True:
+                time.sleep(self.interval)
+                try:
+                    self.release()
+                except Exception as e:
+                    print(f"[INGEST ERROR] {e}")
+
+        self._thread = threading.Thread(target=run, daemon=True)
+        self._thread.start()
+        return self
+
+    def close(self):
+        self.release(flush=True)
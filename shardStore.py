@@ -0,0 +1,129 @@
+import glob
+import json
+import os
+import pandas as pd
+from archiveQuery import queryChunks
+from detectionStore import DEFAULT_STATION
+
+# The detections committed to git: one append-only CSV per day
+# (data/shards/YYYY-MM-DD.csv) plus data/shards/manifest.json with the
+# min/max timestamp and row count of every shard. Only today's shard and
+# the manifest change between auto-commits, so every commit is a small
+# delta however long the history gets. output.csv and its archives stay
+# local.
+SHARD_DIR = "data/shards"
+COLUMNS = ["timestamp", "species", "confidence", "station"]
+
+def shardPath(day, root=SHARD_DIR):
+    return os.path.join(root, "%s.csv" % day)
+
+def _manifestPath(root):
+    return os.path.join(root, "manifest.json")
+
+def readManifest(root=SHARD_DIR):
+    try:
+        with open(_manifestPath(root)) as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return {}
+
+def _writeManifest(manifest, root):
+    tmp = _manifestPath(root) + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump(dict(sorted(manifest.items())), f, indent=1)
+    os.replace(tmp, _manifestPath(root))
+
+def hasShards(root=SHARD_DIR):
+    return len(readManifest(root)) > 0
+
+def _addStation(path):
+    # Shards from before the station column get it once, on the next append
+    with open(path, encoding="utf-8") as f:
+        header = f.readline().strip().split(",")
+    if "station" not in header:
+        df = pd.read_csv(path)
+        df["station"] = DEFAULT_STATION
+        df.to_csv(path + ".tmp", index=False)
+        os.replace(path + ".tmp", path)
+
+def appendShards(df, root=SHARD_DIR):
+    # --- Append detections to their day shards and update the manifest ---
+    if len(df) == 0:
+        return
+    os.makedirs(root, exist_ok=True)
+    if "station" not in df.columns:
+        df = df.assign(station=DEFAULT_STATION)
+    df = df[COLUMNS]
+    ts = pd.to_datetime(df["timestamp"], format="ISO8601")
+    manifest = readManifest(root)
+    for day, part in df.groupby(ts.dt.strftime("%Y-%m-%d"), sort=True):
+        path = shardPath(day, root)
+        exists = os.path.exists(path)
+        if exists:
+            _addStation(path)
+        part.to_csv(path, mode="a", header=not exists, index=False)
+        lo, hi = ts[part.index].min(), ts[part.index].max()
+        entry = manifest.get(day)
+        if entry is None:
+            entry = manifest[day] = {"min": str(lo), "max": str(hi), "rows": 0}
+        entry["min"] = str(min(pd.Timestamp(entry["min"]), lo))
+        entry["max"] = str(max(pd.Timestamp(entry["max"]), hi))
+        entry["rows"] += len(part)
+    _writeManifest(manifest, root)
+
+def shardsFor(start=None, end=None, root=SHARD_DIR):
+    # --- Shards overlapping [start, end], oldest first ---
+    paths = []
+    for day, entry in sorted(readManifest(root).items()):
+        if start is not None and pd.Timestamp(entry["max"]) < pd.Timestamp(start):
+            continue
+        if end is not None and pd.Timestamp(entry["min"]) > pd.Timestamp(end):
+            continue
+        paths.append(shardPath(day, root))
+    return paths
+
+def lastTimestamp(root=SHARD_DIR):
+    manifest = readManifest(root)
+    if len(manifest) == 0:
+        return None
+    return max(pd.Timestamp(e["max"]) for e in manifest.values())
+
+def readShards(start=None, end=None, root=SHARD_DIR, station=None):
+    # --- Detections in [start, end] from the overlapping shards only ---
+    frames = []
+    for path in shardsFor(start, end, root):
+        df = pd.read_csv(path, dtype={"station": str})
+        if "station" not in df.columns:
+            df["station"] = DEFAULT_STATION
+        df["timestamp"] = pd.to_datetime(df["timestamp"], errors="coerce", format="ISO8601")
+        df["confidence"] = pd.to_numeric(df["confidence"], errors="coerce")
+        df = df.dropna()
+        if start is not None:
+            df = df[df["timestamp"] >= pd.Timestamp(start)]
+        if end is not None:
+            df = df[df["timestamp"] <= pd.Timestamp(end)]
+        if station is not None:
+            df = df[df["station"].isin([station] if isinstance(station, str) else station)]
+        frames.append(df)
+    if len(frames) == 0:
+        frames = [pd.DataFrame({"timestamp": pd.Series([], dtype="datetime64[ns]"),
+                                "species": pd.Series([], dtype="object"),
+                                "confidence": pd.Series([], dtype="float64"),
+                                "station": pd.Series([], dtype="object")})]
+    df = pd.concat(frames, ignore_index=True)
+    df["species"] = df["species"].astype("category")
+    df["station"] = df["station"].astype(str).astype("category")
+    return df
+
+def migrateCSV(root=SHARD_DIR):
+    # --- One-shot split of output.csv and the archives into shards ---
+    if glob.glob(os.path.join(root, "????-??-??.csv")):
+        raise SystemExit(f"{root} already has shards")
+    total = 0
+    for chunk in queryChunks():
+        appendShards(chunk.assign(timestamp=chunk["timestamp"].astype(str)), root)
+        total += len(chunk)
+    print(f"[SHARDS] {total} rows in {len(readManifest(root))} shards")
+
+if __name__ == "__main__":
+    migrateCSV()
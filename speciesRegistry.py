@@ -0,0 +1,110 @@
+import os
+import sys
+import numpy as np
+import pandas as pd
+
+# Species registry (data/species.csv): one row per species with a stable
+# integer code, the Dutch label used in the detections, the scientific
+# name and a policy:
+#   policy     "include" or "exclude"
+#   threshold  confidence threshold for this species (empty: page default)
+# Codes are only ever appended, so they stay valid for stored data.
+# Filtering (policyMask) works out the threshold of each category of the
+# detections' species categorical once, then gathers those thresholds by
+# the categorical codes. The registry's own filter goes through the same
+# function with its policy().
+REGISTRY_CSV = "data/species.csv"
+
+class SpeciesRegistry:
+    def __init__(self, frame):
+        self.frame = frame.sort_values("code").reset_index(drop=True)
+        self._index = pd.Index(self.frame["label"])
+
+    @classmethod
+    def load(cls, path=REGISTRY_CSV):
+        if not os.path.exists(path):
+            return cls(pd.DataFrame({"code": pd.Series([], dtype="int16"), "label": [], "scientific": [],
+                                     "policy": [], "threshold": pd.Series([], dtype="float64")}))
+        frame = pd.read_csv(path, dtype={"label": str, "scientific": str, "policy": str}, keep_default_na=False,
+                            na_values={"threshold": [""]})
+        return cls(frame.astype({"code": "int16", "threshold": "float64"}))
+
+    def save(self, path=REGISTRY_CSV):
+        self.frame.to_csv(path + ".tmp", index=False)
+        os.replace(path + ".tmp", path)
+
+    @property
+    def labels(self):
+        return self._index
+
+    def add(self, labels, policy="include", scientific=""):
+        # --- Register unknown labels with the next free codes ---
+        new = pd.Index(pd.unique(np.asarray(labels, dtype=object))).difference(self._index)
+        if len(new) > 0:
+            start = int(self.frame["code"].max()) + 1 if len(self.frame) else 0
+            rows = pd.DataFrame({"code": np.arange(start, start + len(new), dtype="int16"), "label": list(new),
+                                 "scientific": scientific, "policy": policy, "threshold": np.nan})
+            self.__init__(pd.concat([self.frame, rows], ignore_index=True))
+        return self
+
+    def codes(self, species):
+        # --- int16 registry code per detection, -1 for unknown species ---
+        return self._index.get_indexer(species).astype("int16")
+
+    def excluded(self):
+        return sorted(self.frame.loc[self.frame["policy"] == "exclude", "label"])
+
+    def thresholds(self):
+        # Per-species threshold overrides of included species
+        rows = self.frame[(self.frame["policy"] != "exclude") & self.frame["threshold"].notna()]
+        return dict(zip(rows["label"], rows["threshold"].astype(float)))
+
+    def policy(self, confidence_threshold):
+        # --- The filter as a plain dict (stored with the rollups and bouts) ---
+        return {"confidence_threshold": confidence_threshold, "exclude": self.excluded(),
+                "thresholds": self.thresholds()}
+
+    def keep(self, df, confidence_threshold):
+        # --- Boolean mask of the detections above their species' threshold ---
+        return policyMask(df, self.policy(confidence_threshold))
+
+    def scientific(self, label):
+        row = self.frame[self.frame["label"] == label]
+        return row["scientific"].iloc[0] if len(row) else None
+
+def policyThresholds(categories, policy):
+    # --- Threshold per category of a categorical (any category order) ---
+    # +inf for excluded species; the last slot is for missing species (code -1)
+    categories = pd.Index(categories)
+    overrides = pd.Series(policy.get("thresholds", {}), dtype="float64")
+    thr = overrides.reindex(categories).fillna(policy["confidence_threshold"]).to_numpy(dtype="float64", copy=True)
+    thr[categories.isin(policy["exclude"])] = np.inf
+    return np.append(thr, float(policy["confidence_threshold"]))
+
+def policyMask(df, policy):
+    # --- Boolean mask of the detections above their species' threshold: one gather on the codes ---
+    species = df["species"]
+    if not isinstance(species.dtype, pd.CategoricalDtype):
+        species = species.astype("category")
+    thr = policyThresholds(species.cat.categories, policy)
+    return df["confidence"].to_numpy() > thr[species.cat.codes.to_numpy()]
+
+def filterByPolicy(df, policy):
+    return df[policyMask(df, policy)]
+
+def importLabels(labelsPath, path=REGISTRY_CSV):
+    # --- Add scientific names (and new species) from a BirdNET labels file ---
+    registry = SpeciesRegistry.load(path)
+    with open(labelsPath, encoding="utf-8") as f:
+        pairs = [line.rstrip("\n").split("_", 1) for line in f if "_" in line]
+    scientific = {label: sci for sci, label in pairs}
+    registry.add(list(scientific))
+    frame = registry.frame
+    missing = frame["scientific"] == ""
+    frame.loc[missing, "scientific"] = frame.loc[missing, "label"].map(scientific).fillna("")
+    registry.save(path)
+    print(f"[SPECIES] {len(registry.frame)} species, {int((frame['scientific'] != '').sum())} with scientific names")
+
+if __name__ == "__main__":
+    # python speciesRegistry.py LABELS.txt
+    importLabels(sys.argv[1])
@@ -0,0 +1,36 @@
+import contextlib
+import fcntl
+import os
+import threading
+
+# Cross-process write lock for the data directory. The dashboard, the
+# ingest server, reanalyze and the report builds all write the store,
+# shards, rollups and bouts; every read-modify-write of those runs under an
+# exclusive flock on <data>/.write.lock, so only one process writes at a
+# time. The OS drops the lock when its holder dies. Re-entrant within a
+# process (a rollup rebuild inside a locked write does not deadlock).
+DATA_DIR = "data"
+LOCK_NAME = ".write.lock"
+
+_locks = {}
+_guard = threading.Lock()
+
+@contextlib.contextmanager
+def writeLock(directory=DATA_DIR):
+    path = os.path.abspath(os.path.join(directory, LOCK_NAME))
+    with _guard:
+        entry = _locks.setdefault(path, {"lock": threading.RLock(), "file": None, "depth": 0})
+    with entry["lock"]:
+        if entry["depth"] == 0:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            entry["file"] = open(path, "a")
+            fcntl.flock(entry["file"], fcntl.LOCK_EX)
+        entry["depth"] += 1
+        try:
+            yield
+        finally:
+            entry["depth"] -= 1
+            if entry["depth"] == 0:
+                # Closing the file releases the flock
+                entry["file"].close()
+                entry["file"] = None